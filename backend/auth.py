@@ -1,43 +1,162 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status
+from sqlalchemy import delete
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from cache import TTLCache
+from broker import broker
+from models import RevokedRefreshToken
+import asyncio
 import secrets
 import os
+import time
 
 SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-key-change-in-production-please-use-at-least-32-characters")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+# Upper bound on how long a verified access token skips signature checks
+VERIFIED_TOKEN_CACHE_TTL = float(os.getenv("VERIFIED_TOKEN_CACHE_TTL", "300"))
+REVOCATION_CHANNEL = "token_revocations"
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Raising this rehashes each user's password on their next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# bcrypt releases the GIL, so a few threads use that many cores. The pool is
+# separate from the request threadpool so hashing cannot starve other routes.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+# Hashing jobs allowed to wait for a worker before new ones are refused
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+_password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_password_jobs = 0
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
+async def _run_password_job(function, *args):
+    global _password_jobs
+    if _password_jobs >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests, try again shortly",
+            headers={"Retry-After": "1"},
+        )
+    _password_jobs += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_password_executor, function, *args)
+    finally:
+        _password_jobs -= 1
+
+async def hash_password(password: str) -> str:
+    """Hash a password on the dedicated password executor"""
+    return await _run_password_job(pwd_context.hash, password)
+
+async def check_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password on the password executor
+
+    Also returns a new hash when the stored one uses outdated pwd_context
+    parameters, otherwise None.
+    """
+    return await _run_password_job(pwd_context.verify_and_update, plain_password, hashed_password)
+
+def shutdown_password_executor() -> None:
+    _password_executor.shutdown(wait=False, cancel_futures=True)
+
+# token -> verified access token claims
+verified_token_cache = TTLCache(maxsize=10000, ttl=VERIFIED_TOKEN_CACHE_TTL)
+# Access token jti -> True until the revoked token would have expired anyway.
+# Refresh tokens are revoked in the database instead.
+revoked_tokens = TTLCache(maxsize=100000, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+def _credentials_error() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def _encode_token(data: dict, token_type: str, expires_delta: timedelta) -> str:
     to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
-    else:
-        expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    now = datetime.now(timezone.utc)
+    to_encode.update({
+        "type": token_type,
+        "jti": secrets.token_urlsafe(16),
+        "iat": now,
+        "exp": now + expires_delta,
+    })
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def decode_access_token(token: str) -> dict:
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
+    """Short-lived token; data should carry sub, user_id and admin claims"""
+    return _encode_token(data, "access", expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+
+def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
+    return _encode_token(data, "refresh", expires_delta or timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+
+def _decode_token(token: str, token_type: str) -> dict:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _credentials_error()
+    if payload.get("type") != token_type or "jti" not in payload:
+        raise _credentials_error()
+    return payload
+
+def decode_access_token(token: str) -> dict:
+    """Verify an access token, skipping the signature check for recently verified ones"""
+    payload = verified_token_cache.get(token)
+    if payload is None:
+        payload = _decode_token(token, "access")
+        if revoked_tokens.get(payload["jti"]):
+            raise _credentials_error()
+        remaining = payload["exp"] - time.time()
+        verified_token_cache.set(token, payload, ttl=min(remaining, VERIFIED_TOKEN_CACHE_TTL))
+    elif revoked_tokens.get(payload["jti"]):
+        raise _credentials_error()
+    return payload
+
+def decode_refresh_token(token: str) -> dict:
+    """Verify a refresh token's signature and expiry; revocation is checked by claim_refresh_token"""
+    return _decode_token(token, "refresh")
+
+async def claim_refresh_token(db: AsyncSession, claims: dict) -> bool:
+    """Revoke a refresh token in the caller's transaction
+
+    Returns False if it was already revoked. Concurrent claims of the same
+    token serialise on the primary key, so only one of them wins.
+    """
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    claimed = await db.scalar(
+        dialect.insert(RevokedRefreshToken)
+        .values(jti=claims["jti"], expires_at=datetime.utcfromtimestamp(claims["exp"]))
+        .on_conflict_do_nothing(index_elements=["jti"])
+        .returning(RevokedRefreshToken.jti)
+    )
+    return claimed is not None
+
+async def prune_revoked_refresh_tokens(db: AsyncSession) -> int:
+    result = await db.execute(
+        delete(RevokedRefreshToken).where(RevokedRefreshToken.expires_at < datetime.utcnow())
+    )
+    return result.rowcount
+
+def _revoke_local(payload: str) -> None:
+    jti, _, expires_at = payload.partition(":")
+    revoked_tokens.set(jti, True, ttl=max(float(expires_at) - time.time(), 1))
+
+async def revoke_token(claims: dict) -> None:
+    """Reject an access token by jti on every worker until it expires"""
+    payload = f"{claims['jti']}:{claims['exp']}"
+    _revoke_local(payload)
+    await broker.notify(REVOCATION_CHANNEL, payload)
+
+broker.listen(REVOCATION_CHANNEL, _revoke_local)
 
 def generate_api_key() -> str:
     """Generate a secure API key for sensors"""
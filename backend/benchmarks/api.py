@@ -0,0 +1,315 @@
+"""Load-test the API and compare the results against a stored baseline
+
+Seeds benchmark series and measurements, then drives single and bulk
+ingest, filtered range queries, authenticated reads and a concurrent reader
+mix through the API. Requests go to the app in-process unless --url points
+at a running server; either way DATABASE_URL must name the same database,
+which may be PostgreSQL or a SQLite stand-in.
+
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.api --save-baseline
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.api
+
+Each scenario reports requests per second, p50/p95/p99 latency and the
+average number of database queries per request (from the API's Prometheus
+metrics). With a baseline for the database dialect present the run exits
+non-zero when any scenario regresses beyond --tolerance.
+"""
+from datetime import datetime, timedelta
+from pathlib import Path
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+
+import httpx
+from prometheus_client.parser import text_string_to_metric_families
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.engine import make_url
+
+from auth import get_password_hash
+from database import DATABASE_URL, SessionLocal
+from models import Base, Measurement, User
+from rollups import add_to_rollups
+
+BENCH_PREFIX = "bench-"
+BENCH_USER = "bench-admin"
+BENCH_PASSWORD = "bench-password"
+SEED_CHUNK_SIZE = 5000
+SEED_SPAN = timedelta(days=30)
+BULK_SIZE = 500
+BASELINE_DIR = Path(__file__).parent / "baselines"
+# Query counts are deterministic; allow only rounding noise
+QUERY_COUNT_SLACK = 0.05
+
+async def _login(client: httpx.AsyncClient) -> dict:
+    response = await client.post("/api/auth/login", json={"username": BENCH_USER, "password": BENCH_PASSWORD})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+async def _ensure_user() -> None:
+    async with SessionLocal() as db:
+        if await db.scalar(select(User.id).where(User.username == BENCH_USER)) is None:
+            db.add(User(
+                username=BENCH_USER,
+                email=f"{BENCH_USER}@example.com",
+                hashed_password=get_password_hash(BENCH_PASSWORD),
+                is_admin=True
+            ))
+            await db.commit()
+
+async def seed(client: httpx.AsyncClient, headers: dict, series_count: int, measurements: int) -> list:
+    """Replace the benchmark series and fill each with evenly spaced measurements"""
+    for series in (await client.get("/api/series/")).json():
+        if series["name"].startswith(BENCH_PREFIX):
+            (await client.delete(f"/api/series/{series['id']}", headers=headers)).raise_for_status()
+
+    series_ids = []
+    for index in range(series_count):
+        response = await client.post("/api/series/", headers=headers, json={
+            "name": f"{BENCH_PREFIX}{index}",
+            "min_value": 0,
+            "max_value": 100,
+        })
+        response.raise_for_status()
+        series_ids.append(response.json()["id"])
+
+    rng = random.Random(0)
+    end = datetime.utcnow()
+    step = SEED_SPAN / max(measurements, 1)
+    async with SessionLocal() as db:
+        for series_id in series_ids:
+            for offset in range(0, measurements, SEED_CHUNK_SIZE):
+                rows = [
+                    {
+                        "series_id": series_id,
+                        "value": rng.uniform(0, 100),
+                        "timestamp": end - SEED_SPAN + step * position,
+                    }
+                    for position in range(offset, min(offset + SEED_CHUNK_SIZE, measurements))
+                ]
+                await db.execute(insert(Measurement), rows)
+                await add_to_rollups(db, [(row["series_id"], row["timestamp"], row["value"]) for row in rows])
+                await db.commit()
+    return series_ids
+
+def _scenarios(series_ids: list, headers: dict):
+    """Name and request factory of each scenario; a factory returns one request's coroutine"""
+    rng = random.Random(1)
+    end = datetime.utcnow()
+
+    def ingest_single(client):
+        return client.post("/api/measurements/", headers=headers, json={
+            "series_id": rng.choice(series_ids),
+            "value": rng.uniform(0, 100),
+        })
+
+    def ingest_bulk(client):
+        return client.post("/api/measurements/bulk", headers=headers, json={"items": [
+            {"series_id": rng.choice(series_ids), "value": rng.uniform(0, 100)}
+            for _ in range(BULK_SIZE)
+        ]})
+
+    def range_query(client):
+        start = end - timedelta(days=rng.randint(1, 29))
+        return client.get("/api/measurements/", params={
+            "series_ids": ",".join(map(str, rng.sample(series_ids, min(3, len(series_ids))))),
+            "start_date": start.isoformat(),
+            "end_date": (start + timedelta(days=1)).isoformat(),
+            "limit": 1000,
+        })
+
+    def auth_heavy(client):
+        if rng.random() < 0.5:
+            return client.get("/api/auth/me", headers=headers)
+        return client.get("/api/measurements/", headers=headers, params={
+            "series_ids": rng.choice(series_ids),
+            "limit": 10,
+        })
+
+    def concurrent_readers(client):
+        choice = rng.random()
+        if choice < 0.3:
+            return client.get("/api/series/")
+        if choice < 0.6:
+            return client.get("/api/measurements/aggregate", params={
+                "series_ids": ",".join(map(str, series_ids)),
+                "points": 200,
+            })
+        return client.get("/api/measurements/", params={
+            "series_ids": rng.choice(series_ids),
+            "limit": 100,
+        })
+
+    return [
+        ("ingest_single", ingest_single, 1),
+        ("ingest_bulk", ingest_bulk, 1 / 20),
+        ("range_query", range_query, 1),
+        ("auth_heavy", auth_heavy, 1),
+        ("concurrent_readers", concurrent_readers, 1),
+    ]
+
+async def _query_totals(client: httpx.AsyncClient):
+    """Total database queries and requests recorded by the API so far, /metrics excluded"""
+    queries = requests = 0.0
+    text = (await client.get("/metrics")).text
+    for family in text_string_to_metric_families(text):
+        if family.name != "db_queries_per_request":
+            continue
+        for sample in family.samples:
+            if sample.labels.get("route") == "/metrics":
+                continue
+            if sample.name.endswith("_sum"):
+                queries += sample.value
+            elif sample.name.endswith("_count"):
+                requests += sample.value
+    return queries, requests
+
+async def run_scenario(client, factory, requests: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    errors = 0
+
+    async def one_request():
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await factory(client)
+            elapsed = time.perf_counter() - started
+            if response.status_code >= 400:
+                errors += 1
+            return elapsed
+
+    queries_before, requests_before = await _query_totals(client)
+    started = time.perf_counter()
+    latencies = sorted(await asyncio.gather(*(one_request() for _ in range(requests))))
+    elapsed = time.perf_counter() - started
+    queries_after, requests_after = await _query_totals(client)
+
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    counted = requests_after - requests_before
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": requests / elapsed,
+        "p50_ms": quantiles[49] * 1000,
+        "p95_ms": quantiles[94] * 1000,
+        "p99_ms": quantiles[98] * 1000,
+        "queries_per_request": (queries_after - queries_before) / counted if counted else None,
+    }
+
+def _report(name, result):
+    queries = result["queries_per_request"]
+    print(
+        f"{name:>18}: {result['rps']:8.1f} req/s  "
+        f"p50 {result['p50_ms']:7.2f} ms  "
+        f"p95 {result['p95_ms']:7.2f} ms  "
+        f"p99 {result['p99_ms']:7.2f} ms  "
+        f"queries/req {queries if queries is None else round(queries, 2)}  "
+        f"errors {result['errors']}"
+    )
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions of results against baseline, as readable messages"""
+    regressions = []
+    for name, result in results.items():
+        expected = baseline["scenarios"].get(name)
+        if expected is None:
+            continue
+        if result["errors"] > expected["errors"]:
+            regressions.append(f"{name}: {result['errors']} errors, baseline {expected['errors']}")
+        if result["p95_ms"] > expected["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {result['p95_ms']:.2f} ms, baseline {expected['p95_ms']:.2f} ms")
+        if result["rps"] < expected["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: {result['rps']:.1f} req/s, baseline {expected['rps']:.1f} req/s")
+        if (
+            result["queries_per_request"] is not None
+            and expected["queries_per_request"] is not None
+            and result["queries_per_request"] > expected["queries_per_request"] + QUERY_COUNT_SLACK
+        ):
+            regressions.append(
+                f"{name}: {result['queries_per_request']:.2f} queries/request, "
+                f"baseline {expected['queries_per_request']:.2f}"
+            )
+    return regressions
+
+def _client(url):
+    if url:
+        return httpx.AsyncClient(base_url=url, timeout=60)
+    from main import app
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=60)
+
+async def run(args) -> dict:
+    if make_url(DATABASE_URL).get_backend_name() == "sqlite":
+        # The SQLite stand-in has no init.sql; build the schema from the models
+        sync_engine = create_engine(DATABASE_URL)
+        Base.metadata.create_all(sync_engine)
+        sync_engine.dispose()
+
+    await _ensure_user()
+    async with _client(args.url) as client:
+        headers = await _login(client)
+        started = time.perf_counter()
+        series_ids = await seed(client, headers, args.series, args.measurements)
+        print(f"seeded {args.series} x {args.measurements} measurements in {time.perf_counter() - started:.1f} s")
+
+        results = {}
+        for name, factory, share in _scenarios(series_ids, headers):
+            if args.only and name not in args.only:
+                continue
+            results[name] = await run_scenario(client, factory, max(1, int(args.requests * share)), args.concurrency)
+            _report(name, results[name])
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Base URL of a running API; default is in-process")
+    parser.add_argument("--series", type=int, default=10)
+    parser.add_argument("--measurements", type=int, default=10000, help="Measurements per series")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--only", nargs="*", help="Run only these scenarios")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative latency/throughput change")
+    parser.add_argument("--baseline", type=Path, help="Baseline file; default benchmarks/baselines/<dialect>.json")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline")
+    args = parser.parse_args()
+
+    dialect = make_url(DATABASE_URL).get_backend_name()
+    baseline_path = args.baseline or BASELINE_DIR / f"{dialect}.json"
+    params = {
+        "dialect": dialect,
+        "series": args.series,
+        "measurements": args.measurements,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+    }
+    print(f"{args.requests} requests per scenario, concurrency {args.concurrency}, {dialect}")
+
+    results = asyncio.run(run(args))
+
+    if args.save_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps({"params": params, "scenarios": results}, indent=2))
+        print(f"baseline saved to {baseline_path}")
+        return
+
+    if not baseline_path.exists():
+        print(f"no baseline at {baseline_path}; run with --save-baseline to create one")
+        return
+
+    baseline = json.loads(baseline_path.read_text())
+    if baseline["params"] != params:
+        print(f"baseline {baseline_path} was recorded with {baseline['params']}; not comparing")
+        sys.exit(2)
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("\nPERFORMANCE REGRESSION")
+        for message in regressions:
+            print(f"  {message}")
+        sys.exit(1)
+    print("\nno regressions against baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Compare the synchronous and asyncio database stacks
+
+Replays the queries behind a typical authenticated read (user lookup plus a
+filtered measurement range scan) with the same concurrency against a sync
+engine driven by a thread pool, like FastAPI's sync routes, and against the
+async engine used by the API.
+
+    python -m benchmarks.engines --requests 2000 --concurrency 64
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+
+from database import DATABASE_URL, to_async_url
+from models import Measurement, User
+
+# Starlette's default threadpool size for sync endpoints
+THREADPOOL_SIZE = 40
+
+def _statements():
+    since = datetime.utcnow() - timedelta(days=7)
+    user_query = select(User.id, User.username, User.is_admin).where(User.username == "admin")
+    range_query = (
+        select(Measurement)
+        .where(Measurement.series_id.in_([1, 2, 3]), Measurement.timestamp >= since)
+        .order_by(Measurement.timestamp.desc())
+        .limit(1000)
+    )
+    return user_query, range_query
+
+def _report(name, latencies, elapsed):
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(
+        f"{name:>6}: {len(latencies) / elapsed:8.1f} req/s  "
+        f"p50 {quantiles[49] * 1000:7.2f} ms  "
+        f"p95 {quantiles[94] * 1000:7.2f} ms  "
+        f"p99 {quantiles[98] * 1000:7.2f} ms"
+    )
+
+def run_sync(requests: int, concurrency: int):
+    engine = create_engine(DATABASE_URL)
+    user_query, range_query = _statements()
+
+    def one_request():
+        started = time.perf_counter()
+        with Session(engine) as db:
+            db.execute(user_query).first()
+            db.scalars(range_query).all()
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(concurrency, THREADPOOL_SIZE)) as pool:
+        latencies = list(pool.map(lambda _: one_request(), range(requests)))
+    _report("sync", latencies, time.perf_counter() - started)
+    engine.dispose()
+
+async def run_async(requests: int, concurrency: int):
+    engine = create_async_engine(to_async_url(DATABASE_URL))
+    user_query, range_query = _statements()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one_request():
+        async with semaphore:
+            started = time.perf_counter()
+            async with AsyncSession(engine) as db:
+                (await db.execute(user_query)).first()
+                (await db.scalars(range_query)).all()
+            return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(one_request() for _ in range(requests)))
+    _report("async", list(latencies), time.perf_counter() - started)
+    await engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, {DATABASE_URL}")
+    run_sync(args.requests, args.concurrency)
+    asyncio.run(run_async(args.requests, args.concurrency))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+from typing import Callable, Dict, Iterable, List, Optional, Set
+import asyncio
+import json
+import logging
+import os
+
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger(__name__)
+
+# "memory" fans out inside this worker only; "postgres" goes through
+# LISTEN/NOTIFY so every worker sees every new measurement
+BROKER_BACKEND = os.getenv("BROKER_BACKEND", "memory")
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("SUBSCRIBER_QUEUE_SIZE", "1000"))
+NOTIFY_CHANNEL = "measurements"
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes or more
+NOTIFY_BATCH_SIZE = 50
+
+class Subscription:
+    """Queue of new measurements for one client, filtered by series"""
+
+    def __init__(self, series_ids: Optional[Set[int]]):
+        self.series_ids = series_ids
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        # Set when the client fell too far behind and missed points
+        self.overflowed = False
+
+    def offer(self, points: List[dict]) -> None:
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(points)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+class InProcessBroker:
+    """Fan-out of newly committed measurements to subscribers in this process"""
+
+    def __init__(self):
+        self._by_series: Dict[int, Set[Subscription]] = {}
+        self._all: Set[Subscription] = set()
+        self._channel_listeners: Dict[str, List[Callable[[str], None]]] = {}
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    def subscribe(self, series_ids: Optional[Iterable[int]] = None) -> Subscription:
+        subscription = Subscription(set(series_ids) if series_ids else None)
+        if subscription.series_ids is None:
+            self._all.add(subscription)
+        else:
+            for series_id in subscription.series_ids:
+                self._by_series.setdefault(series_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._all.discard(subscription)
+        for series_id in subscription.series_ids or ():
+            subscribers = self._by_series.get(series_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._by_series[series_id]
+
+    async def publish(self, points: List[dict]) -> None:
+        """Announce measurements that have been committed"""
+        self._deliver(points)
+
+    def listen(self, channel: str, callback: Callable[[str], None]) -> None:
+        """Register a callback for control messages such as cache invalidations
+
+        Must be called before start().
+        """
+        self._channel_listeners.setdefault(channel, []).append(callback)
+
+    async def notify(self, channel: str, payload: str = "") -> None:
+        """Send a control message to every worker, this one included"""
+        self._dispatch(channel, payload)
+
+    def _dispatch(self, channel: str, payload: str) -> None:
+        for callback in self._channel_listeners.get(channel, ()):
+            try:
+                callback(payload)
+            except Exception:
+                logger.exception("Listener for %s failed", channel)
+
+    def _deliver(self, points: List[dict]) -> None:
+        batches: Dict[Subscription, List[dict]] = {}
+        for point in points:
+            for subscription in self._by_series.get(point["series_id"], ()):
+                batches.setdefault(subscription, []).append(point)
+        for subscription in self._all:
+            batches[subscription] = points
+        for subscription, batch in batches.items():
+            subscription.offer(batch)
+
+class PostgresBroker(InProcessBroker):
+    """Broker relaying measurements between workers through LISTEN/NOTIFY"""
+
+    def __init__(self, database_url: str):
+        super().__init__()
+        url = make_url(database_url)
+        self._dsn = url.set(drivername="postgresql").render_as_string(hide_password=False)
+        self._listener = None
+        self._publisher = None
+        self._publish_lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        import asyncpg
+
+        self._listener = await asyncpg.connect(self._dsn)
+        await self._listener.add_listener(NOTIFY_CHANNEL, self._on_notify)
+        for channel in self._channel_listeners:
+            await self._listener.add_listener(
+                channel, lambda connection, pid, channel, payload: self._dispatch(channel, payload)
+            )
+        self._publisher = await asyncpg.connect(self._dsn)
+
+    async def stop(self) -> None:
+        for connection in (self._listener, self._publisher):
+            if connection is not None:
+                await connection.close()
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        try:
+            self._deliver(json.loads(payload))
+        except ValueError:
+            logger.warning("Ignoring malformed measurement notification")
+
+    async def publish(self, points: List[dict]) -> None:
+        # Delivery to local subscribers happens when our own NOTIFY comes back
+        try:
+            async with self._publish_lock:
+                for offset in range(0, len(points), NOTIFY_BATCH_SIZE):
+                    payload = json.dumps(points[offset:offset + NOTIFY_BATCH_SIZE])
+                    await self._publisher.execute("SELECT pg_notify($1, $2)", NOTIFY_CHANNEL, payload)
+        except Exception:
+            # The data is committed; live subscribers just miss this update
+            logger.exception("Failed to publish measurements")
+
+    async def notify(self, channel: str, payload: str = "") -> None:
+        try:
+            async with self._publish_lock:
+                await self._publisher.execute("SELECT pg_notify($1, $2)", channel, payload)
+        except Exception:
+            logger.exception("Failed to notify %s", channel)
+            # At least keep this worker consistent
+            self._dispatch(channel, payload)
+
+def create_broker() -> InProcessBroker:
+    if BROKER_BACKEND == "postgres":
+        from database import DATABASE_URL
+        return PostgresBroker(DATABASE_URL)
+    return InProcessBroker()
+
+broker = create_broker()
+
+def measurement_event(measurement_id: int, series_id: int, value: float, timestamp, created_by) -> dict:
+    return {
+        "id": measurement_id,
+        "series_id": series_id,
+        "value": value,
+        "timestamp": timestamp.isoformat(),
+        "created_by": created_by,
+    }
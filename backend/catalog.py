@@ -0,0 +1,99 @@
+from typing import Dict, List, Optional
+import asyncio
+import os
+import time
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from broker import broker
+from database import SessionLocal, engine
+from etags import make_etag
+from models import Series
+from schemas import SeriesResponse
+
+# Safety net in case an invalidation from another worker is missed
+CATALOG_TTL = float(os.getenv("CATALOG_TTL", "300"))
+INVALIDATION_CHANNEL = "series_catalog"
+
+class SeriesCatalog:
+    """In-process copy of the series table
+
+    Series metadata is small and changes rarely, so reads and range checks
+    are served from memory. The series write endpoints call invalidate(),
+    which reaches every worker through the broker.
+    """
+
+    def __init__(self):
+        self._by_id: Dict[int, SeriesResponse] = {}
+        self._ordered: List[SeriesResponse] = []
+        self._etag = ""
+        self._loaded_at: Optional[float] = None
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.loads = 0
+
+    async def _ensure_loaded(self, db: AsyncSession) -> None:
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < CATALOG_TTL:
+            self.hits += 1
+            return
+
+        async with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < CATALOG_TTL:
+                self.hits += 1
+                return
+
+            generation = self._generation
+            query = select(Series).order_by(Series.created_at.desc())
+            if db.bind is engine:
+                rows = (await db.scalars(query)).all()
+            else:
+                # A lagging replica would pin a stale catalog until the TTL
+                async with SessionLocal() as primary:
+                    rows = (await primary.scalars(query)).all()
+            ordered = [SeriesResponse.model_validate(row) for row in rows]
+            etag = make_etag(sorted((row.id, row.version) for row in rows))
+            self._by_id = {entry.id: entry for entry in ordered}
+            self._ordered, self._etag = ordered, etag
+            self.loads += 1
+            # If invalidated while loading, serve this result once and reload next time
+            if generation == self._generation:
+                self._loaded_at = time.monotonic()
+
+    async def get(self, db: AsyncSession, series_id: int) -> Optional[SeriesResponse]:
+        await self._ensure_loaded(db)
+        return self._by_id.get(series_id)
+
+    async def get_many(self, db: AsyncSession, series_ids) -> Dict[int, SeriesResponse]:
+        await self._ensure_loaded(db)
+        return {series_id: self._by_id[series_id] for series_id in series_ids if series_id in self._by_id}
+
+    async def all(self, db: AsyncSession) -> List[SeriesResponse]:
+        """All series, newest first"""
+        await self._ensure_loaded(db)
+        return self._ordered
+
+    async def etag(self, db: AsyncSession) -> str:
+        await self._ensure_loaded(db)
+        return self._etag
+
+    def invalidate_local(self, payload: str = "") -> None:
+        self._generation += 1
+        self._loaded_at = None
+
+    async def invalidate(self) -> None:
+        """Drop the catalog on every worker after a committed series change"""
+        self.invalidate_local()
+        await broker.notify(INVALIDATION_CHANNEL)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._by_id),
+            "hits": self.hits,
+            "loads": self.loads,
+            "ttl": CATALOG_TTL,
+        }
+
+series_catalog = SeriesCatalog()
+broker.listen(INVALIDATION_CHANNEL, series_catalog.invalidate_local)
@@ -0,0 +1,74 @@
+"""Remove duplicate measurements and add the unique index used by DEDUP_MODE=timestamp
+
+Keeps the oldest row (lowest id) of every (series_id, timestamp) group,
+rebuilds the rollups of the affected buckets and bumps the series' data
+version, one series per transaction.
+
+    python -m dedup                 # report and delete duplicates
+    python -m dedup --dry-run       # only count them
+    python -m dedup --create-index  # then create the unique index
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import delete, exists, func, select, text
+from sqlalchemy.orm import aliased
+
+from database import SessionLocal, engine
+from etags import bump_data_version
+from models import Measurement, Series
+from rollups import recompute_rollups
+
+UNIQUE_INDEX = "idx_measurements_series_timestamp_unique"
+
+def _has_older_twin():
+    older = aliased(Measurement)
+    return exists().where(
+        older.series_id == Measurement.series_id,
+        older.timestamp == Measurement.timestamp,
+        older.id < Measurement.id
+    )
+
+async def deduplicate(dry_run: bool = False) -> int:
+    total = 0
+    async with SessionLocal() as db:
+        series_ids = (await db.scalars(select(Series.id).order_by(Series.id))).all()
+
+    for series_id in series_ids:
+        async with SessionLocal() as db:
+            condition = (Measurement.series_id == series_id, _has_older_twin())
+            if dry_run:
+                count = await db.scalar(select(func.count()).select_from(Measurement).where(*condition))
+            else:
+                timestamps = (await db.scalars(
+                    delete(Measurement).where(*condition).returning(Measurement.timestamp)
+                )).all()
+                count = len(timestamps)
+                if count:
+                    await recompute_rollups(db, series_id, set(timestamps))
+                    await bump_data_version(db, [series_id])
+                    await db.commit()
+        if count:
+            print(f"series {series_id}: {count} duplicate measurements{' found' if dry_run else ' removed'}")
+        total += count
+    return total
+
+async def create_unique_index() -> None:
+    async with engine.begin() as connection:
+        await connection.execute(text(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS {UNIQUE_INDEX} ON measurements (series_id, timestamp)"
+        ))
+
+async def main(args) -> None:
+    total = await deduplicate(args.dry_run)
+    print(f"{total} duplicate measurements{' found' if args.dry_run else ' removed'}")
+    if args.create_index and not args.dry_run:
+        await create_unique_index()
+        print(f"created {UNIQUE_INDEX}")
+    await engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--create-index", action="store_true")
+    asyncio.run(main(parser.parse_args()))
@@ -1,43 +1,67 @@
 from fastapi import Depends, HTTPException, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from typing import Optional
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials, APIKeyHeader
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import NamedTuple, Optional
 from database import get_db
 from auth import decode_access_token
-from models import User
+from broker import broker
+from cache import TTLCache
+from models import User, Sensor
+import os
 
 security = HTTPBearer(auto_error=False)
+sensor_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
+
+SENSOR_KEY_CACHE_TTL = float(os.getenv("SENSOR_KEY_CACHE_TTL", "300"))
+SENSOR_KEY_NEGATIVE_TTL = 5.0
+SENSOR_KEY_CHANNEL = "sensor_key_revocations"
+
+class UserPrincipal(NamedTuple):
+    id: int
+    username: str
+    is_admin: bool
+
+class SensorPrincipal(NamedTuple):
+    id: int
+    series_id: int
+
+# api_key -> SensorPrincipal, or False for keys known to be invalid
+sensor_key_cache = TTLCache(maxsize=10000, ttl=SENSOR_KEY_CACHE_TTL)
+
+def _evict_sensor_key(api_key: str) -> None:
+    sensor_key_cache.delete(api_key)
+
+async def invalidate_sensor_key(api_key: str) -> None:
+    """Drop a sensor key from every worker's cache so revocation takes effect immediately"""
+    _evict_sensor_key(api_key)
+    await broker.notify(SENSOR_KEY_CHANNEL, api_key)
+
+broker.listen(SENSOR_KEY_CHANNEL, _evict_sensor_key)
 
 async def get_current_user(
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
-    db: Session = Depends(get_db)
-) -> Optional[User]:
-    """Get current user from JWT token (optional - returns None if not authenticated)"""
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+) -> Optional[UserPrincipal]:
+    """Get current user from JWT token (optional - returns None if not authenticated)
+
+    The principal comes from the access token's claims alone; the users table
+    is only consulted when a refresh token is exchanged.
+    """
     if credentials is None:
         return None
 
-    token = credentials.credentials
-    payload = decode_access_token(token)
-    username: str = payload.get("sub")
-
-    if username is None:
+    payload = decode_access_token(credentials.credentials)
+    if payload.get("sub") is None or payload.get("user_id") is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials"
         )
 
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found"
-        )
-
-    return user
+    return UserPrincipal(payload["user_id"], payload["sub"], bool(payload.get("admin")))
 
 async def get_current_active_user(
-    current_user: Optional[User] = Depends(get_current_user)
-) -> User:
+    current_user: Optional[UserPrincipal] = Depends(get_current_user)
+) -> UserPrincipal:
     """Require authenticated user"""
     if current_user is None:
         raise HTTPException(
@@ -47,8 +71,8 @@ async def get_current_active_user(
     return current_user
 
 async def get_current_admin_user(
-    current_user: User = Depends(get_current_active_user)
-) -> User:
+    current_user: UserPrincipal = Depends(get_current_active_user)
+) -> UserPrincipal:
     """Require admin user"""
     if not current_user.is_admin:
         raise HTTPException(
@@ -56,3 +80,50 @@ async def get_current_admin_user(
             detail="Not enough permissions"
         )
     return current_user
+
+async def get_current_db_user(
+    current_user: UserPrincipal = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+) -> User:
+    """Require authenticated user and load the full User row"""
+    user = await db.get(User, current_user.id)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found"
+        )
+    return user
+
+async def get_current_sensor(
+    api_key: Optional[str] = Depends(sensor_key_header),
+    db: AsyncSession = Depends(get_db)
+) -> SensorPrincipal:
+    """Require a valid sensor API key (X-API-Key header)"""
+    if api_key is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Missing API key"
+        )
+
+    principal = sensor_key_cache.get(api_key)
+    if principal is None:
+        sensor = (await db.execute(
+            select(Sensor.id, Sensor.series_id).where(
+                Sensor.api_key == api_key,
+                Sensor.is_active.is_(True)
+            )
+        )).first()
+        if sensor is None:
+            sensor_key_cache.set(api_key, False, ttl=SENSOR_KEY_NEGATIVE_TTL)
+            principal = False
+        else:
+            principal = SensorPrincipal(sensor.id, sensor.series_id)
+            sensor_key_cache.set(api_key, principal)
+
+    if principal is False:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid API key"
+        )
+
+    return principal
@@ -0,0 +1,76 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Optional
+import hashlib
+
+from fastapi import Request, Response, status
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Series
+
+async def data_validators(db: AsyncSession, series_ids: Optional[Iterable[int]], *params):
+    """ETag and Last-Modified for a measurement query over series_ids (all if None)"""
+    query = select(Series.id, Series.data_version, Series.data_updated_at).order_by(Series.id)
+    if series_ids:
+        query = query.where(Series.id.in_(series_ids))
+    rows = (await db.execute(query)).all()
+    etag = make_etag([(row.id, row.data_version) for row in rows], *params)
+    last_modified = max((row.data_updated_at for row in rows), default=None)
+    return etag, last_modified
+
+async def bump_data_version(db: AsyncSession, series_ids: Iterable[int]) -> None:
+    """Mark measurements of these series as changed, in the caller's transaction
+
+    Rows are locked in id order first so concurrent multi-series writes
+    cannot deadlock on each other. The lock is FOR NO KEY UPDATE: the
+    caller's measurement and rollup inserts already hold FOR KEY SHARE on
+    these rows through their foreign keys, which FOR UPDATE would conflict
+    with.
+    """
+    series_ids = sorted(set(series_ids))
+    if not series_ids:
+        return
+    locked = (
+        select(Series.id).where(Series.id.in_(series_ids))
+        .order_by(Series.id).with_for_update(key_share=True)
+    )
+    await db.execute(
+        update(Series)
+        .where(Series.id.in_(locked.scalar_subquery()))
+        .values(data_version=Series.data_version + 1, data_updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+def not_modified(request: Request, response: Response, etag: str,
+                 last_modified: Optional[datetime] = None) -> Optional[Response]:
+    """Set validators on response; return a 304 response if the client's copy is current"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(
+            last_modified.replace(microsecond=0, tzinfo=timezone.utc), usegmt=True
+        )
+    response.headers.update(headers)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if etag in (tag.strip() for tag in if_none_match.split(",")) or if_none_match.strip() == "*":
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return None
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).astimezone(timezone.utc).replace(tzinfo=None)
+        except (TypeError, ValueError):
+            return None
+        # Last-Modified is truncated to whole seconds, so comparing truncated
+        # values would hide later writes in the same second; the ETag stays
+        # the precise validator
+        if last_modified <= since:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return None
@@ -0,0 +1,222 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import os
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from broker import broker, measurement_event
+from catalog import series_catalog
+from etags import bump_data_version
+from ingest_buffer import ingest_buffer
+from metrics import record_ingest
+from models import IdempotencyKey, Measurement
+from rollups import UPSERT_CHUNK_SIZE, naive_utc, add_to_rollups, recompute_rollups
+
+# "none" stores every write; "timestamp" keeps one measurement per
+# (series_id, timestamp) and needs the unique index created by dedup.py
+DEDUP_MODE = os.getenv("DEDUP_MODE", "none")
+# With DEDUP_MODE=timestamp: "ignore" keeps the stored value, "update" replaces it
+DEDUP_CONFLICT = os.getenv("DEDUP_CONFLICT", "ignore")
+IDEMPOTENCY_KEY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24"))
+
+def _insert(db: AsyncSession, table):
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    return dialect.insert(table)
+
+async def write_measurements(db: AsyncSession, rows: List[dict]) -> List[Optional[int]]:
+    """Insert measurement rows with their rollups and data version bump
+
+    Returns the measurement id for each row, aligned with rows. In
+    timestamp dedup mode a row matching a stored (series_id, timestamp) is
+    skipped (None) or overwrites the stored value (its id), with one
+    INSERT ... ON CONFLICT statement per chunk of rows. Rows repeating a (series_id,
+    timestamp) within the batch are collapsed first: the first one is kept
+    when ignoring, the last when updating, and the others get None. The
+    caller commits.
+    """
+    if not rows:
+        return []
+
+    if DEDUP_MODE != "timestamp":
+        ids = (await db.scalars(
+            _insert(db, Measurement).returning(Measurement.id, sort_by_parameter_order=True),
+            rows
+        )).all()
+        await add_to_rollups(db, ((row["series_id"], row["timestamp"], row["value"]) for row in rows))
+        await bump_data_version(db, {row["series_id"] for row in rows})
+        return list(ids)
+
+    # One statement cannot touch the same conflict target twice
+    keys = [(row["series_id"], naive_utc(row["timestamp"])) for row in rows]
+    chosen: Dict[tuple, int] = {}
+    for index, key in enumerate(keys):
+        if DEDUP_CONFLICT == "update" or key not in chosen:
+            chosen[key] = index
+
+    # Key order, so concurrent batches lock colliding rows in the same order
+    values = [{**rows[chosen[key]], "timestamp": key[1]} for key in sorted(chosen)]
+    written = []
+    for offset in range(0, len(values), UPSERT_CHUNK_SIZE):
+        statement = _insert(db, Measurement).values(values[offset:offset + UPSERT_CHUNK_SIZE])
+        if DEDUP_CONFLICT == "update":
+            statement = statement.on_conflict_do_update(
+                index_elements=["series_id", "timestamp"],
+                set_={"value": statement.excluded.value, "created_by": statement.excluded.created_by}
+            )
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=["series_id", "timestamp"])
+        written += (await db.execute(statement.returning(
+            Measurement.id, Measurement.series_id, Measurement.timestamp, Measurement.value
+        ))).all()
+
+    if written:
+        if DEDUP_CONFLICT == "update":
+            # Overwritten values cannot be folded in; rebuild their buckets
+            timestamps: Dict[int, list] = {}
+            for row in written:
+                timestamps.setdefault(row.series_id, []).append(row.timestamp)
+            for series_id, series_timestamps in timestamps.items():
+                await recompute_rollups(db, series_id, series_timestamps)
+        else:
+            await add_to_rollups(db, ((row.series_id, row.timestamp, row.value) for row in written))
+        await bump_data_version(db, {row.series_id for row in written})
+
+    ids = {(row.series_id, naive_utc(row.timestamp)): row.id for row in written}
+    return [ids.get(key) if chosen[key] == index else None for index, key in enumerate(keys)]
+
+async def publish_measurements(rows: List[dict], ids: List[Optional[int]]) -> int:
+    """Count and broadcast committed rows; ids as returned by write_measurements
+
+    Rows without an id were dropped as duplicates and are skipped. Returns
+    the number of rows published.
+    """
+    written = [(measurement_id, row) for measurement_id, row in zip(ids, rows) if measurement_id is not None]
+    for series_id, count in Counter(row["series_id"] for _, row in written).items():
+        record_ingest(series_id, accepted=count)
+    await broker.publish([
+        measurement_event(
+            measurement_id, row["series_id"], row["value"], row["timestamp"], row["created_by"]
+        )
+        for measurement_id, row in written
+    ])
+    return len(written)
+
+async def find_measurement(db: AsyncSession, series_id: int, timestamp: datetime) -> Optional[Measurement]:
+    """Stored measurement a deduplicated write collided with"""
+    return await db.scalar(select(Measurement).where(
+        Measurement.series_id == series_id,
+        Measurement.timestamp == naive_utc(timestamp)
+    ).limit(1))
+
+async def claim_idempotency_key(db: AsyncSession, series_id: int, key: str) -> Tuple[bool, Optional[Measurement]]:
+    """Reserve key for this write
+
+    Returns (True, None) when claimed, else (False, the measurement stored
+    by the earlier write with this key, if any). A concurrent write holding
+    the same key makes this wait until that transaction ends.
+    """
+    claimed = await db.scalar(
+        _insert(db, IdempotencyKey)
+        .values(series_id=series_id, key=key, created_at=datetime.utcnow())
+        .on_conflict_do_nothing(index_elements=["series_id", "key"])
+        .returning(IdempotencyKey.key)
+    )
+    if claimed is not None:
+        return True, None
+
+    measurement_id = await db.scalar(select(IdempotencyKey.measurement_id).where(
+        IdempotencyKey.series_id == series_id,
+        IdempotencyKey.key == key
+    ))
+    return False, await db.get(Measurement, measurement_id) if measurement_id is not None else None
+
+async def store_idempotency_key(db: AsyncSession, series_id: int, key: str, measurement_id: Optional[int]) -> None:
+    await db.execute(update(IdempotencyKey).where(
+        IdempotencyKey.series_id == series_id,
+        IdempotencyKey.key == key
+    ).values(measurement_id=measurement_id))
+
+async def prune_idempotency_keys(db: AsyncSession) -> int:
+    cutoff = datetime.utcnow() - timedelta(hours=IDEMPOTENCY_KEY_TTL_HOURS)
+    result = await db.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < cutoff))
+    return result.rowcount
+
+async def ingest_measurement(db: AsyncSession, row: dict, idempotency_key: Optional[str] = None):
+    """Store one measurement row and commit
+
+    Returns (measurement, created). A retry with a known idempotency key, or
+    a duplicate dropped by timestamp dedup, returns the stored measurement
+    with created False. Raises LookupError when the key's measurement has
+    since been deleted.
+    """
+    if idempotency_key is not None:
+        claimed, existing = await claim_idempotency_key(db, row["series_id"], idempotency_key)
+        if not claimed:
+            if existing is None:
+                raise LookupError(idempotency_key)
+            return existing, False
+
+    measurement_id = (await write_measurements(db, [row]))[0]
+    existing = None
+    if measurement_id is None:
+        existing = await find_measurement(db, row["series_id"], row["timestamp"])
+        measurement_id = existing.id
+    if idempotency_key is not None:
+        await store_idempotency_key(db, row["series_id"], idempotency_key, measurement_id)
+    await db.commit()
+
+    if existing is not None:
+        return existing, False
+    return {**row, "id": measurement_id}, True
+
+async def ingest_point(
+    db: AsyncSession,
+    series_id: int,
+    value: float,
+    timestamp: Optional[datetime],
+    created_by: Optional[int],
+    idempotency_key: Optional[str] = None,
+):
+    """Validate and store one measurement for the single-point ingest endpoints
+
+    Returns the endpoint response: the measurement, or in buffered mode
+    whatever the ingest buffer acknowledges with. Writes carrying an
+    idempotency key are always written directly.
+    """
+    series = await series_catalog.get(db, series_id)
+    if not series:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Series not found"
+        )
+
+    if not (series.min_value <= value <= series.max_value):
+        record_ingest(series.id, rejected=1)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Value must be between {series.min_value} and {series.max_value}"
+        )
+
+    row = {
+        "series_id": series_id,
+        "value": value,
+        "timestamp": timestamp or datetime.utcnow(),
+        "created_by": created_by
+    }
+    if ingest_buffer.enabled and idempotency_key is None:
+        return await ingest_buffer.ingest(db, row)
+
+    try:
+        measurement, created = await ingest_measurement(db, row, idempotency_key)
+    except LookupError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Idempotency-Key belongs to a measurement that no longer exists"
+        )
+    if created:
+        await publish_measurements([row], [measurement["id"]])
+    return measurement
@@ -0,0 +1,147 @@
+from typing import List, Optional, Tuple
+import asyncio
+import logging
+import os
+import time
+
+from fastapi import HTTPException, status
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import SessionLocal
+from metrics import INGEST_FLUSH_FAILURES, INGEST_FLUSH_LATENCY, INGEST_FLUSH_SIZE, INGEST_QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+# "direct" commits every measurement in its request; "buffered" queues
+# single-point writes and commits them in groups
+INGEST_MODE = os.getenv("INGEST_MODE", "direct")
+# "queued" acknowledges once a point is in the buffer (202, lost if the
+# process dies before the flush); "flushed" waits for its group commit (201)
+INGEST_ACK = os.getenv("INGEST_ACK", "flushed")
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "10000"))
+INGEST_FLUSH_SIZE_LIMIT = int(os.getenv("INGEST_FLUSH_SIZE", "1000"))
+INGEST_FLUSH_INTERVAL = float(os.getenv("INGEST_FLUSH_INTERVAL_MS", "50")) / 1000
+
+_STOP = object()
+
+class IngestBuffer:
+    """Bounded queue of measurement rows written in group commits by one background task"""
+
+    def __init__(self, enabled: bool, wait_for_flush: bool):
+        self.enabled = enabled
+        self.wait_for_flush = wait_for_flush
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._pending = 0
+        self._task: Optional[asyncio.Task] = None
+        self._accepting = False
+
+    def start(self) -> None:
+        if self.enabled:
+            self._accepting = True
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Refuse new points and flush everything already queued"""
+        if self._task is None:
+            return
+        self._accepting = False
+        self._queue.put_nowait(_STOP)
+        await self._task
+        self._task = None
+
+    async def submit(self, row: dict) -> Optional[int]:
+        """Queue one measurement row
+
+        Returns its id once committed when waiting for the flush, else None.
+        """
+        if not self._accepting:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Ingest is shutting down",
+                headers={"Retry-After": "5"},
+            )
+        if self._pending >= INGEST_QUEUE_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Ingest queue is full, retry shortly",
+                headers={"Retry-After": "1"},
+            )
+
+        future = asyncio.get_running_loop().create_future() if self.wait_for_flush else None
+        self._pending += 1
+        INGEST_QUEUE_DEPTH.set(self._pending)
+        self._queue.put_nowait((row, future))
+        if future is None:
+            return None
+        return await future
+
+    async def ingest(self, db: AsyncSession, row: dict):
+        """Submit one row and build the ingest endpoint's response for it"""
+        measurement_id = await self.submit(row)
+        if measurement_id is not None:
+            return {**row, "id": measurement_id}
+        if not self.wait_for_flush:
+            return ORJSONResponse({**row, "id": None}, status_code=status.HTTP_202_ACCEPTED)
+        # Dropped by timestamp dedup: answer with the stored point, as a direct write does
+        from ingest import find_measurement
+        return await find_measurement(db, row["series_id"], row["timestamp"])
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + INGEST_FLUSH_INTERVAL
+            while len(batch) < INGEST_FLUSH_SIZE_LIMIT:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[dict, Optional[asyncio.Future]]]) -> None:
+        # ingest imports this module for the buffer instance
+        from ingest import publish_measurements, write_measurements
+
+        rows = [row for row, _ in batch]
+        started = time.perf_counter()
+        try:
+            async with SessionLocal() as db:
+                inserted_ids = await write_measurements(db, rows)
+                await db.commit()
+        except Exception:
+            INGEST_FLUSH_FAILURES.inc()
+            logger.exception("Failed to flush %d buffered measurements", len(rows))
+            for _, future in batch:
+                if future is not None and not future.done():
+                    future.set_exception(HTTPException(
+                        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                        detail="Measurement could not be stored"
+                    ))
+            return
+        finally:
+            self._pending -= len(batch)
+            INGEST_QUEUE_DEPTH.set(self._pending)
+            INGEST_FLUSH_LATENCY.observe(time.perf_counter() - started)
+            INGEST_FLUSH_SIZE.observe(len(batch))
+
+        # Points dropped by timestamp dedup resolve to None
+        for (_, future), measurement_id in zip(batch, inserted_ids):
+            if future is not None and not future.done():
+                future.set_result(measurement_id)
+        await publish_measurements(rows, inserted_ids)
+
+ingest_buffer = IngestBuffer(INGEST_MODE == "buffered", INGEST_ACK == "flushed")
@@ -1,14 +1,42 @@
-from fastapi import FastAPI, Depends
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from sqlalchemy import text
-from sqlalchemy.orm import Session
-from routers import auth, series, measurements
-from database import get_db
+from routers import auth, series, measurements, sensors
+from database import engine, read_engine, pool_status, read_pool_status
+from dependencies import sensor_key_cache
+from auth import verified_token_cache, shutdown_password_executor
+from catalog import series_catalog
+from metrics import PrometheusMiddleware, instrument_engine
+from compression import CompressionMiddleware
+from partitions import partition_maintenance
+from retention import retention_worker
+from broker import broker
+from ingest_buffer import ingest_buffer
+import asyncio
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await broker.start()
+    ingest_buffer.start()
+    tasks = [
+        asyncio.create_task(partition_maintenance(engine)),
+        asyncio.create_task(retention_worker(engine)),
+    ]
+    yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await ingest_buffer.stop()
+    await broker.stop()
+    shutdown_password_executor()
 
 app = FastAPI(
     title="measures API",
     description="API for collecting and managing measurement data from multiple series",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 
@@ -18,23 +46,31 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Last-Modified", "X-Bucket-Seconds"],
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(PrometheusMiddleware)
+instrument_engine(engine.sync_engine)
+if read_engine is not engine:
+    instrument_engine(read_engine.sync_engine)
 
 
 app.include_router(auth.router)
 app.include_router(series.router)
 app.include_router(measurements.router)
+app.include_router(sensors.router)
 
 @app.get("/")
 async def root():
     return {"message": "measures API"}
 
 @app.get("/api/health")
-async def health_check(db: Session = Depends(get_db)):
+async def health_check():
     """Health check endpoint - verifies API and database connectivity"""
     try:
 
-        db.execute(text("SELECT 1"))
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
         return {
             "status": "healthy",
             "database": "connected"
@@ -45,3 +81,21 @@ async def health_check(db: Session = Depends(get_db)):
             "database": "disconnected",
             "error": str(e)
         }
+
+@app.get("/api/metrics")
+async def metrics():
+    """Internal cache and connection pool metrics"""
+    return {
+        "database_pool": pool_status(),
+        "read_database_pool": read_pool_status(),
+        "caches": {
+            "verified_tokens": verified_token_cache.stats(),
+            "sensor_keys": sensor_key_cache.stats(),
+            "series_catalog": series_catalog.stats()
+        }
+    }
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,138 @@
+from contextvars import ContextVar
+from typing import Optional
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency",
+    ["method", "route", "status"],
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being handled",
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes",
+    "HTTP response body size",
+    ["method", "route"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216),
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request",
+    "Database statements executed per HTTP request",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100),
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "Database statement execution time",
+    ["route"],
+)
+INGEST_ACCEPTED = Counter(
+    "measurements_ingested_total",
+    "Measurements accepted for storage",
+    ["series_id"],
+)
+INGEST_REJECTED = Counter(
+    "measurements_rejected_total",
+    "Measurements rejected by validation",
+    ["series_id", "reason"],
+)
+INGEST_QUEUE_DEPTH = Gauge(
+    "ingest_queue_depth",
+    "Measurements waiting in the write-behind ingest buffer",
+)
+INGEST_FLUSH_LATENCY = Histogram(
+    "ingest_flush_duration_seconds",
+    "Time to write one group commit from the ingest buffer",
+)
+INGEST_FLUSH_SIZE = Histogram(
+    "ingest_flush_size",
+    "Measurements written per group commit",
+    buckets=(1, 5, 10, 50, 100, 250, 500, 1000, 2500, 5000),
+)
+INGEST_FLUSH_FAILURES = Counter(
+    "ingest_flush_failures_total",
+    "Group commits from the ingest buffer that failed",
+)
+
+class _RequestStats:
+    __slots__ = ("scope", "queries")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.queries = 0
+
+    @property
+    def route(self) -> str:
+        # Starlette stores the matched route in the scope once routing has run
+        route = self.scope.get("route")
+        return route.path if route is not None else "unmatched"
+
+_request_stats: ContextVar[Optional[_RequestStats]] = ContextVar("request_stats", default=None)
+
+def record_ingest(series_id: int, accepted: int = 0, rejected: int = 0, reason: str = "out_of_range") -> None:
+    if accepted:
+        INGEST_ACCEPTED.labels(series_id=str(series_id)).inc(accepted)
+    if rejected:
+        INGEST_REJECTED.labels(series_id=str(series_id), reason=reason).inc(rejected)
+
+def instrument_engine(engine: Engine) -> None:
+    """Count and time every statement, attributing it to the current request"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._query_started
+        stats = _request_stats.get()
+        if stats is None:
+            DB_QUERY_DURATION.labels(route="background").observe(elapsed)
+            return
+        stats.queries += 1
+        DB_QUERY_DURATION.labels(route=stats.route).observe(elapsed)
+
+class PrometheusMiddleware:
+    """ASGI middleware recording latency, in-flight count and response size per route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = _RequestStats(scope)
+        token = _request_stats.set(stats)
+        status_code = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUESTS_IN_FLIGHT.dec()
+            _request_stats.reset(token)
+
+            method = scope["method"]
+            route = stats.route
+            REQUEST_LATENCY.labels(method=method, route=route, status=str(status_code)).observe(elapsed)
+            RESPONSE_SIZE.labels(method=method, route=route).observe(size)
+            DB_QUERIES_PER_REQUEST.labels(method=method, route=route).observe(stats.queries)
@@ -1,5 +1,5 @@
 
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
@@ -16,6 +16,17 @@ class User(Base):
     is_admin = Column(Boolean, default=False, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class RevokedRefreshToken(Base):
+    """jti of a refresh token that was rotated or logged out, kept until it expires"""
+    __tablename__ = "revoked_refresh_tokens"
+
+    jti = Column(String(64), primary_key=True)
+    expires_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("idx_revoked_refresh_tokens_expires_at", expires_at),
+    )
+
 class Series(Base):
     __tablename__ = "series"
 
@@ -26,20 +37,89 @@ class Series(Base):
     max_value = Column(Float, nullable=False)
     color = Column(String(7), default="#3B82F6")
     unit = Column(String(20), default="")
+    # Retention in days; NULL keeps data forever
+    raw_retention_days = Column(Integer)
+    rollup_retention_days = Column(Integer)
+    # Bumped on metadata changes and on measurement writes respectively;
+    # they drive the ETag / Last-Modified headers of the read endpoints
+    version = Column(BigInteger, default=1, nullable=False)
+    data_version = Column(BigInteger, default=0, nullable=False)
+    data_updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     created_by = Column(Integer, ForeignKey("users.id"))
 
-    measurements = relationship("Measurement", back_populates="series", cascade="all, delete-orphan")
+    # Children are removed by ON DELETE CASCADE in the database, never loaded
+    measurements = relationship("Measurement", back_populates="series", passive_deletes="all")
     creator = relationship("User")
 
 class Measurement(Base):
+    """Raw measurement
+
+    In PostgreSQL the table is range-partitioned by month on timestamp (see
+    database/init.sql), so its real primary key is (id, timestamp). Ids come
+    from a single sequence, so the ORM keeps using id alone as identity.
+    """
     __tablename__ = "measurements"
 
-    id = Column(Integer, primary_key=True, index=True)
-    series_id = Column(Integer, ForeignKey("series.id"), nullable=False, index=True)
+    id = Column(Integer, primary_key=True)
+    series_id = Column(Integer, ForeignKey("series.id", ondelete="CASCADE"), nullable=False)
     value = Column(Float, nullable=False)
-    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
     created_by = Column(Integer, ForeignKey("users.id"))
 
     series = relationship("Series", back_populates="measurements")
     creator = relationship("User")
+
+    __table_args__ = (
+        Index(
+            "idx_measurements_series_timestamp",
+            series_id, timestamp.desc(),
+            postgresql_include=["value"]
+        ),
+        Index("idx_measurements_timestamp_id", timestamp.desc(), id.desc()),
+    )
+
+class MeasurementRollup(Base):
+    """Pre-aggregated measurements per series for one bucket width (hour or day)"""
+    __tablename__ = "measurement_rollups"
+
+    series_id = Column(Integer, ForeignKey("series.id", ondelete="CASCADE"), primary_key=True)
+    bucket_seconds = Column(Integer, primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    min = Column(Float, nullable=False)
+    max = Column(Float, nullable=False)
+    sum = Column(Float, nullable=False)
+    count = Column(BigInteger, nullable=False)
+    first_value = Column(Float, nullable=False)
+    first_timestamp = Column(DateTime, nullable=False)
+    last_value = Column(Float, nullable=False)
+    last_timestamp = Column(DateTime, nullable=False)
+
+class Sensor(Base):
+    __tablename__ = "sensors"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), nullable=False)
+    api_key = Column(String(64), unique=True, index=True, nullable=False)
+    series_id = Column(Integer, ForeignKey("series.id", ondelete="CASCADE"), nullable=False)
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    series = relationship("Series")
+
+class IdempotencyKey(Base):
+    """Idempotency-Key of an accepted measurement write, kept for replaying retries
+
+    Separate from measurements because a unique index on the partitioned
+    table would have to include timestamp.
+    """
+    __tablename__ = "measurement_idempotency_keys"
+
+    series_id = Column(Integer, ForeignKey("series.id", ondelete="CASCADE"), primary_key=True)
+    key = Column(String(100), primary_key=True)
+    measurement_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("idx_measurement_idempotency_keys_created_at", created_at),
+    )
@@ -0,0 +1,87 @@
+from datetime import date
+from typing import List, Optional
+import asyncio
+import logging
+import os
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "2"))
+PARTITION_CHECK_INTERVAL = float(os.getenv("PARTITION_CHECK_INTERVAL", str(6 * 60 * 60)))
+
+def month_start(day: date, offset: int = 0) -> date:
+    """First day of the month `offset` months after the one containing day"""
+    months = day.year * 12 + day.month - 1 + offset
+    return date(months // 12, months % 12 + 1, 1)
+
+async def ensure_partitions(engine: AsyncEngine, months_ahead: int = PARTITION_MONTHS_AHEAD) -> List[str]:
+    """Create monthly measurement partitions for this month and the next ones"""
+    if engine.dialect.name != "postgresql":
+        return []
+
+    today = date.today()
+    async with engine.begin() as connection:
+        return [
+            await connection.scalar(
+                text("SELECT create_measurement_partition(:month)"),
+                {"month": month_start(today, offset)}
+            )
+            for offset in range(months_ahead + 1)
+        ]
+
+async def detach_partition(engine: AsyncEngine, month: date) -> Optional[str]:
+    """Detach one month of measurements; returns the standalone table name"""
+    async with engine.begin() as connection:
+        return await connection.scalar(
+            text("SELECT detach_measurement_partition(:month)"),
+            {"month": month_start(month)}
+        )
+
+async def attach_partition(engine: AsyncEngine, month: date) -> str:
+    """Re-attach a previously detached month of measurements"""
+    async with engine.begin() as connection:
+        return await connection.scalar(
+            text("SELECT attach_measurement_partition(:month)"),
+            {"month": month_start(month)}
+        )
+
+async def drop_partitions_before(engine: AsyncEngine, cutoff: date) -> List[str]:
+    """Detach and drop monthly partitions that end on or before cutoff"""
+    if engine.dialect.name != "postgresql":
+        return []
+
+    async with engine.begin() as connection:
+        names = (await connection.scalars(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'measurements'::regclass"
+        ))).all()
+
+    dropped = []
+    for name in sorted(names):
+        try:
+            year, month = name.rsplit("_", 2)[1:]
+            month = date(int(year), int(month), 1)
+        except ValueError:
+            # measurements_default and anything not created by us
+            continue
+        if month_start(month, 1) > cutoff:
+            continue
+
+        await detach_partition(engine, month)
+        async with engine.begin() as connection:
+            await connection.execute(text(f'DROP TABLE "{name}"'))
+        dropped.append(name)
+    return dropped
+
+async def partition_maintenance(engine: AsyncEngine) -> None:
+    """Background task keeping upcoming partitions in place"""
+    while True:
+        try:
+            await ensure_partitions(engine)
+        except Exception:
+            logger.exception("Measurement partition maintenance failed")
+        await asyncio.sleep(PARTITION_CHECK_INTERVAL)
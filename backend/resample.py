@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+from typing import List
+
+import numpy as np
+
+FILL_METHODS = ("null", "locf", "linear")
+
+def time_axis(start: datetime, step_seconds: int, points: int) -> np.ndarray:
+    return np.datetime64(start, "us") + np.arange(points) * np.timedelta64(step_seconds, "s")
+
+def resample(buckets: List[dict], series_ids: List[int], start: datetime, step_seconds: int, points: int, fill: str) -> np.ndarray:
+    """Matrix of bucket averages, one row per series and one column per axis step
+
+    buckets are aggregate_buckets() results aligned to the same step. Empty
+    steps are NaN, then filled with the last observation ("locf"), by
+    linear interpolation between neighbours ("linear"), or left empty.
+    Leading and trailing steps with no neighbour on that side stay NaN.
+    """
+    matrix = np.full((len(series_ids), points), np.nan)
+    if buckets:
+        rows = {series_id: row for row, series_id in enumerate(series_ids)}
+        row_index = np.fromiter((rows[bucket["series_id"]] for bucket in buckets), dtype=np.int64, count=len(buckets))
+        column_index = np.fromiter(
+            ((bucket["bucket"] - start) // timedelta(seconds=step_seconds) for bucket in buckets),
+            dtype=np.int64, count=len(buckets)
+        )
+        values = np.fromiter((bucket["avg"] for bucket in buckets), dtype=np.float64, count=len(buckets))
+        inside = (column_index >= 0) & (column_index < points)
+        matrix[row_index[inside], column_index[inside]] = values[inside]
+
+    if fill == "locf":
+        known = ~np.isnan(matrix)
+        # Column of the latest known value at or before each step
+        last_known = np.maximum.accumulate(np.where(known, np.arange(points), 0), axis=1)
+        filled = np.take_along_axis(matrix, last_known, axis=1)
+        matrix = np.where(np.logical_or.accumulate(known, axis=1), filled, np.nan)
+    elif fill == "linear":
+        steps = np.arange(points)
+        for row in matrix:
+            known = ~np.isnan(row)
+            if known.sum() > 1:
+                row[:] = np.interp(steps, steps[known], row[known], left=np.nan, right=np.nan)
+    return matrix
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+from typing import Dict
+import asyncio
+import logging
+import os
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from auth import prune_revoked_refresh_tokens
+from database import SessionLocal
+from etags import bump_data_version
+from ingest import prune_idempotency_keys
+from models import Measurement, MeasurementRollup, Series
+from partitions import drop_partitions_before
+
+logger = logging.getLogger(__name__)
+
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "10000"))
+RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL", "3600"))
+
+async def _delete_in_batches(table, id_column, *conditions) -> int:
+    """Delete matching rows RETENTION_BATCH_SIZE at a time, one transaction per batch"""
+    deleted = 0
+    while True:
+        async with SessionLocal() as db:
+            batch = select(id_column).where(*conditions).limit(RETENTION_BATCH_SIZE)
+            result = await db.execute(delete(table).where(id_column.in_(batch)))
+            await db.commit()
+        deleted += result.rowcount
+        if result.rowcount < RETENTION_BATCH_SIZE:
+            return deleted
+        # Let request handlers run between batches
+        await asyncio.sleep(0)
+
+async def enforce_retention(engine: AsyncEngine) -> Dict[str, int]:
+    """Apply every series' raw and rollup retention settings once"""
+    now = datetime.utcnow()
+    async with SessionLocal() as db:
+        policies = (await db.execute(
+            select(Series.id, Series.raw_retention_days, Series.rollup_retention_days)
+        )).all()
+
+    # Partitions hold every series, so whole months can only be dropped once
+    # all series agree they are past retention
+    raw_days = [policy.raw_retention_days for policy in policies]
+    if raw_days and None not in raw_days:
+        cutoff = now - timedelta(days=max(raw_days))
+        dropped = await drop_partitions_before(engine, cutoff.date())
+        for name in dropped:
+            logger.info("Dropped expired partition %s", name)
+        if dropped:
+            # A month partition holds rows of any series; finding out which
+            # would mean scanning it, so every series is marked as changed
+            async with SessionLocal() as db:
+                await bump_data_version(db, [policy.id for policy in policies])
+                await db.commit()
+
+    deleted = {"measurements": 0, "rollups": 0, "idempotency_keys": 0, "refresh_tokens": 0}
+    for policy in policies:
+        if policy.raw_retention_days:
+            removed = await _delete_in_batches(
+                Measurement.__table__, Measurement.id,
+                Measurement.series_id == policy.id,
+                Measurement.timestamp < now - timedelta(days=policy.raw_retention_days)
+            )
+            if removed:
+                async with SessionLocal() as db:
+                    await bump_data_version(db, [policy.id])
+                    await db.commit()
+            deleted["measurements"] += removed
+        if policy.rollup_retention_days:
+            async with SessionLocal() as db:
+                result = await db.execute(delete(MeasurementRollup).where(
+                    MeasurementRollup.series_id == policy.id,
+                    MeasurementRollup.bucket < now - timedelta(days=policy.rollup_retention_days)
+                ))
+                await db.commit()
+            deleted["rollups"] += result.rowcount
+
+    async with SessionLocal() as db:
+        deleted["idempotency_keys"] = await prune_idempotency_keys(db)
+        deleted["refresh_tokens"] = await prune_revoked_refresh_tokens(db)
+        await db.commit()
+    return deleted
+
+async def retention_worker(engine: AsyncEngine) -> None:
+    """Background task enforcing retention every RETENTION_INTERVAL seconds"""
+    while True:
+        try:
+            deleted = await enforce_retention(engine)
+            if any(deleted.values()):
+                logger.info("Retention removed %(measurements)d measurements and %(rollups)d rollups", deleted)
+        except Exception:
+            logger.exception("Retention run failed")
+        await asyncio.sleep(RETENTION_INTERVAL)
@@ -0,0 +1,307 @@
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import Integer, case, cast, delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Measurement, MeasurementRollup
+
+# Fixed origin so bucket boundaries stay stable between requests
+BUCKET_ORIGIN = datetime(2000, 1, 1)
+# Finest first: each coarser rollup is recomputed from the one before it
+ROLLUP_RESOLUTIONS = (3600, 86400)
+# Keeps multi-row upserts well below the bind parameter limit
+UPSERT_CHUNK_SIZE = 500
+
+Point = Tuple[int, datetime, float]
+
+def naive_utc(timestamp: datetime) -> datetime:
+    if timestamp.tzinfo is not None:
+        return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+def bucket_start(timestamp: datetime, bucket_seconds: int) -> datetime:
+    """Start of the bucket containing timestamp, aligned to BUCKET_ORIGIN"""
+    width = timedelta(seconds=bucket_seconds)
+    return BUCKET_ORIGIN + ((naive_utc(timestamp) - BUCKET_ORIGIN) // width) * width
+
+def _bucket_ceil(timestamp: datetime, bucket_seconds: int) -> datetime:
+    start = bucket_start(timestamp, bucket_seconds)
+    if start == naive_utc(timestamp):
+        return start
+    return start + timedelta(seconds=bucket_seconds)
+
+def bucket_expression(db: AsyncSession, column, bucket_seconds: int):
+    """SQL expression mapping a timestamp column to the start of its bucket"""
+    if db.get_bind().dialect.name == "sqlite":
+        epoch = cast(func.strftime("%s", column), Integer)
+        offset = int((BUCKET_ORIGIN - datetime(1970, 1, 1)).total_seconds())
+        start = ((epoch - offset) // bucket_seconds) * bucket_seconds + offset
+        return func.datetime(start, "unixepoch")
+    return func.date_bin(timedelta(seconds=bucket_seconds), column, BUCKET_ORIGIN)
+
+def _insert(db: AsyncSession):
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    return dialect.insert(MeasurementRollup)
+
+async def _upsert(db: AsyncSession, rows: List[dict], merge: bool) -> None:
+    """Insert rollup rows, merging into existing buckets or replacing them"""
+    table = MeasurementRollup.__table__.c
+    for offset in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        statement = _insert(db).values(rows[offset:offset + UPSERT_CHUNK_SIZE])
+        new = statement.excluded
+        if merge:
+            earlier = new.first_timestamp < table.first_timestamp
+            later = new.last_timestamp >= table.last_timestamp
+            values = {
+                "min": case((new.min < table.min, new.min), else_=table.min),
+                "max": case((new.max > table.max, new.max), else_=table.max),
+                "sum": table.sum + new.sum,
+                "count": table.count + new.count,
+                "first_value": case((earlier, new.first_value), else_=table.first_value),
+                "first_timestamp": case((earlier, new.first_timestamp), else_=table.first_timestamp),
+                "last_value": case((later, new.last_value), else_=table.last_value),
+                "last_timestamp": case((later, new.last_timestamp), else_=table.last_timestamp),
+            }
+        else:
+            values = {
+                name: getattr(new, name)
+                for name in ("min", "max", "sum", "count", "first_value",
+                             "first_timestamp", "last_value", "last_timestamp")
+            }
+        await db.execute(statement.on_conflict_do_update(
+            index_elements=["series_id", "bucket_seconds", "bucket"],
+            set_=values
+        ))
+
+async def add_to_rollups(db: AsyncSession, points: Iterable[Point]) -> None:
+    """Fold newly inserted measurements into their hourly and daily rollups
+
+    Points are pre-aggregated per bucket, so a batch costs one upsert per
+    chunk of touched buckets rather than one per point.
+    """
+    partials = {}
+    for series_id, timestamp, value in points:
+        timestamp = naive_utc(timestamp)
+        for bucket_seconds in ROLLUP_RESOLUTIONS:
+            key = (series_id, bucket_seconds, bucket_start(timestamp, bucket_seconds))
+            partial = partials.get(key)
+            if partial is None:
+                partials[key] = {
+                    "series_id": series_id,
+                    "bucket_seconds": bucket_seconds,
+                    "bucket": key[2],
+                    "min": value,
+                    "max": value,
+                    "sum": value,
+                    "count": 1,
+                    "first_value": value,
+                    "first_timestamp": timestamp,
+                    "last_value": value,
+                    "last_timestamp": timestamp,
+                }
+                continue
+
+            partial["min"] = min(partial["min"], value)
+            partial["max"] = max(partial["max"], value)
+            partial["sum"] += value
+            partial["count"] += 1
+            if timestamp < partial["first_timestamp"]:
+                partial["first_value"], partial["first_timestamp"] = value, timestamp
+            if timestamp >= partial["last_timestamp"]:
+                partial["last_value"], partial["last_timestamp"] = value, timestamp
+
+    if partials:
+        # Key order, so concurrent batches lock shared rollup rows in the same order
+        await _upsert(db, [partials[key] for key in sorted(partials)], merge=True)
+
+async def recompute_rollups(db: AsyncSession, series_id: int, timestamps: Iterable[datetime]) -> None:
+    """Rebuild the rollup buckets containing timestamps after an update or delete
+
+    Hourly buckets are recomputed from raw measurements, daily buckets from
+    the hourly rollups. Pending ORM changes must be flushed first.
+    """
+    timestamps = [naive_utc(timestamp) for timestamp in timestamps]
+    finer = None
+    for bucket_seconds in ROLLUP_RESOLUTIONS:
+        for bucket in {bucket_start(timestamp, bucket_seconds) for timestamp in timestamps}:
+            bucket_end = bucket + timedelta(seconds=bucket_seconds)
+            if finer is None:
+                row = await _bucket_from_raw(db, series_id, bucket, bucket_end)
+            else:
+                row = await _bucket_from_rollups(db, series_id, finer, bucket, bucket_end)
+
+            if row is None:
+                await db.execute(delete(MeasurementRollup).where(
+                    MeasurementRollup.series_id == series_id,
+                    MeasurementRollup.bucket_seconds == bucket_seconds,
+                    MeasurementRollup.bucket == bucket
+                ))
+                continue
+
+            row.update(series_id=series_id, bucket_seconds=bucket_seconds, bucket=bucket)
+            await _upsert(db, [row], merge=False)
+        finer = bucket_seconds
+
+async def _bucket_from_raw(db, series_id, bucket, bucket_end) -> Optional[dict]:
+    in_bucket = (
+        Measurement.series_id == series_id,
+        Measurement.timestamp >= bucket,
+        Measurement.timestamp < bucket_end,
+    )
+    stats = (await db.execute(select(
+        func.min(Measurement.value),
+        func.max(Measurement.value),
+        func.sum(Measurement.value),
+        func.count(Measurement.id),
+    ).where(*in_bucket))).one()
+    if not stats[3]:
+        return None
+
+    first = (await db.execute(
+        select(Measurement.value, Measurement.timestamp).where(*in_bucket)
+        .order_by(Measurement.timestamp, Measurement.id).limit(1)
+    )).one()
+    last = (await db.execute(
+        select(Measurement.value, Measurement.timestamp).where(*in_bucket)
+        .order_by(Measurement.timestamp.desc(), Measurement.id.desc()).limit(1)
+    )).one()
+    return _bucket_row(stats, first, last)
+
+async def _bucket_from_rollups(db, series_id, finer, bucket, bucket_end) -> Optional[dict]:
+    in_bucket = (
+        MeasurementRollup.series_id == series_id,
+        MeasurementRollup.bucket_seconds == finer,
+        MeasurementRollup.bucket >= bucket,
+        MeasurementRollup.bucket < bucket_end,
+    )
+    stats = (await db.execute(select(
+        func.min(MeasurementRollup.min),
+        func.max(MeasurementRollup.max),
+        func.sum(MeasurementRollup.sum),
+        func.sum(MeasurementRollup.count),
+    ).where(*in_bucket))).one()
+    if not stats[3]:
+        return None
+
+    first = (await db.execute(
+        select(MeasurementRollup.first_value, MeasurementRollup.first_timestamp)
+        .where(*in_bucket).order_by(MeasurementRollup.bucket).limit(1)
+    )).one()
+    last = (await db.execute(
+        select(MeasurementRollup.last_value, MeasurementRollup.last_timestamp)
+        .where(*in_bucket).order_by(MeasurementRollup.bucket.desc()).limit(1)
+    )).one()
+    return _bucket_row(stats, first, last)
+
+def _bucket_row(stats, first, last) -> dict:
+    return {
+        "min": stats[0],
+        "max": stats[1],
+        "sum": stats[2],
+        "count": stats[3],
+        "first_value": first[0],
+        "first_timestamp": first[1],
+        "last_value": last[0],
+        "last_timestamp": last[1],
+    }
+
+async def _aggregate_raw(db, series_ids, bucket_seconds, start=None, end=None, end_inclusive=True):
+    filters = []
+    if series_ids:
+        filters.append(Measurement.series_id.in_(series_ids))
+    if start is not None:
+        filters.append(Measurement.timestamp >= start)
+    if end is not None:
+        filters.append(Measurement.timestamp <= end if end_inclusive else Measurement.timestamp < end)
+
+    bucket = bucket_expression(db, Measurement.timestamp, bucket_seconds).label("bucket")
+    return (await db.execute(
+        select(
+            Measurement.series_id,
+            bucket,
+            func.min(Measurement.value).label("min"),
+            func.max(Measurement.value).label("max"),
+            func.sum(Measurement.value).label("sum"),
+            func.count(Measurement.id).label("count"),
+        )
+        .where(*filters)
+        .group_by(Measurement.series_id, bucket)
+    )).all()
+
+async def _aggregate_rollups(db, series_ids, resolution, bucket_seconds, start=None, end=None):
+    filters = [MeasurementRollup.bucket_seconds == resolution]
+    if series_ids:
+        filters.append(MeasurementRollup.series_id.in_(series_ids))
+    if start is not None:
+        filters.append(MeasurementRollup.bucket >= start)
+    if end is not None:
+        filters.append(MeasurementRollup.bucket < end)
+
+    bucket = bucket_expression(db, MeasurementRollup.bucket, bucket_seconds).label("bucket")
+    return (await db.execute(
+        select(
+            MeasurementRollup.series_id,
+            bucket,
+            func.min(MeasurementRollup.min).label("min"),
+            func.max(MeasurementRollup.max).label("max"),
+            func.sum(MeasurementRollup.sum).label("sum"),
+            func.sum(MeasurementRollup.count).label("count"),
+        )
+        .where(*filters)
+        .group_by(MeasurementRollup.series_id, bucket)
+    )).all()
+
+async def aggregate_buckets(
+    db: AsyncSession,
+    series_ids: Optional[List[int]],
+    bucket_seconds: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> List[dict]:
+    """min/max/avg/count per series and bucket over [start, end]
+
+    When bucket_seconds is a multiple of a rollup resolution, whole rollup
+    buckets inside the range are read from measurement_rollups and only the
+    partial buckets at the edges of the range touch raw measurements.
+    """
+    resolution = max((r for r in ROLLUP_RESOLUTIONS if bucket_seconds % r == 0), default=None)
+    inner_start = _bucket_ceil(start, resolution) if resolution and start is not None else None
+    inner_end = bucket_start(end, resolution) if resolution and end is not None else None
+
+    if resolution is None or (inner_start is not None and inner_end is not None and inner_start >= inner_end):
+        parts = await _aggregate_raw(db, series_ids, bucket_seconds, start, end)
+    else:
+        parts = list(await _aggregate_rollups(db, series_ids, resolution, bucket_seconds, inner_start, inner_end))
+        if start is not None and start < inner_start:
+            parts += await _aggregate_raw(db, series_ids, bucket_seconds, start, inner_start, end_inclusive=False)
+        if end is not None:
+            parts += await _aggregate_raw(db, series_ids, bucket_seconds, inner_end, end)
+
+    merged = {}
+    for part in parts:
+        bucket = part.bucket
+        if isinstance(bucket, str):
+            bucket = datetime.fromisoformat(bucket)
+        key = (part.series_id, bucket)
+        current = merged.get(key)
+        if current is None:
+            merged[key] = [part.min, part.max, part.sum, part.count]
+        else:
+            current[0] = min(current[0], part.min)
+            current[1] = max(current[1], part.max)
+            current[2] += part.sum
+            current[3] += part.count
+
+    return [
+        {
+            "series_id": series_id,
+            "bucket": bucket,
+            "min": values[0],
+            "max": values[1],
+            "avg": values[2] / values[3],
+            "count": values[3],
+        }
+        for (series_id, bucket), values in sorted(merged.items())
+    ]
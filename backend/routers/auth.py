@@ -1,33 +1,47 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
-from schemas import UserCreate, UserResponse, LoginRequest, Token, UserUpdate
+from schemas import UserCreate, UserResponse, LoginRequest, Token, UserUpdate, RefreshRequest
 from models import User
-from auth import verify_password, get_password_hash, create_access_token
-from dependencies import get_current_active_user
-from datetime import timedelta
+from auth import (
+    check_password, hash_password, create_access_token, create_refresh_token, claim_refresh_token,
+    decode_access_token, decode_refresh_token, revoke_token, ACCESS_TOKEN_EXPIRE_MINUTES
+)
+from throttle import check_login_allowed, login_failures
+from dependencies import get_current_db_user, security
 
 router = APIRouter(prefix="/api/auth", tags=["Authentication"])
 
+def _issue_tokens(user) -> dict:
+    claims = {"sub": user.username, "user_id": user.id, "admin": user.is_admin}
+    return {
+        "access_token": create_access_token(claims),
+        "refresh_token": create_refresh_token({"sub": user.username, "user_id": user.id}),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
     """Register a new user (reader by default)"""
 
-    if db.query(User).filter(User.username == user_data.username).first():
+    if await db.scalar(select(User.id).where(User.username == user_data.username)):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already registered"
         )
 
 
-    if db.query(User).filter(User.email == user_data.email).first():
+    if await db.scalar(select(User.id).where(User.email == user_data.email)):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
 
 
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await hash_password(user_data.password)
     db_user = User(
         username=user_data.username,
         email=user_data.email,
@@ -35,46 +49,95 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
         is_admin=False
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
 
     return db_user
 
 @router.post("/login", response_model=Token)
-def login(login_data: LoginRequest, db: Session = Depends(get_db)):
-    """Login and get access token"""
-    user = db.query(User).filter(User.username == login_data.username).first()
+async def login(login_data: LoginRequest, request: Request, db: AsyncSession = Depends(get_db)):
+    """Login and get access token
+
+    Throttled per username (failed attempts) and per client address (all
+    attempts). Passwords hashed with outdated parameters are rehashed.
+    """
+    check_login_allowed(login_data.username, request.client.host if request.client else "")
 
-    if not user or not verify_password(login_data.password, user.hashed_password):
+    user = await db.scalar(select(User).where(User.username == login_data.username))
+
+    verified, new_hash = await check_password(login_data.password, user.hashed_password) if user else (False, None)
+    if not verified:
+        login_failures.hit(login_data.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password"
         )
+    login_failures.reset(login_data.username)
 
-    access_token = create_access_token(
-        data={"sub": user.username, "admin": user.is_admin}
-    )
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+
+    return _issue_tokens(user)
+
+@router.post("/refresh", response_model=Token)
+async def refresh(refresh_data: RefreshRequest, db: AsyncSession = Depends(get_db)):
+    """Exchange a refresh token for a new token pair
+
+    The user is reloaded so the new access token carries current claims; the
+    presented refresh token is revoked (rotation), so it works only once.
+    """
+    claims = decode_refresh_token(refresh_data.refresh_token)
+    user = await db.get(User, claims.get("user_id"))
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found"
+        )
 
-    return {"access_token": access_token, "token_type": "bearer"}
+    if not await claim_refresh_token(db, claims):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    await db.commit()
+    return _issue_tokens(user)
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    refresh_data: RefreshRequest,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_db)
+):
+    """Revoke the refresh token and, if sent, the current access token"""
+    await claim_refresh_token(db, decode_refresh_token(refresh_data.refresh_token))
+    await db.commit()
+    if credentials is not None:
+        try:
+            await revoke_token(decode_access_token(credentials.credentials))
+        except HTTPException:
+            # Already expired or revoked
+            pass
+    return None
 
 @router.get("/me", response_model=UserResponse)
-def get_current_user_info(current_user: User = Depends(get_current_active_user)):
+async def get_current_user_info(current_user: User = Depends(get_current_db_user)):
     """Get current user information"""
     return current_user
 
 @router.put("/me", response_model=UserResponse)
-def update_current_user(
+async def update_current_user(
     user_update: UserUpdate,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_db_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Update current user information (email and/or password)"""
     if user_update.email:
 
-        existing = db.query(User).filter(
+        existing = await db.scalar(select(User.id).where(
             User.email == user_update.email,
             User.id != current_user.id
-        ).first()
+        ))
         if existing:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -83,9 +146,8 @@ def update_current_user(
         current_user.email = user_update.email
 
     if user_update.password:
-        current_user.hashed_password = get_password_hash(user_update.password)
+        current_user.hashed_password = await hash_password(user_update.password)
 
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
 
     return current_user
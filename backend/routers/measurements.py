@@ -1,51 +1,502 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy import func, tuple_, select
+from sqlalchemy.exc import IntegrityError
+from typing import Annotated, List, Optional, Union
 from datetime import datetime
-from database import get_db
-from schemas import MeasurementCreate, MeasurementUpdate, MeasurementResponse
-from models import Measurement, Series, User
-from dependencies import get_current_user, get_current_admin_user
+from collections import Counter
+import asyncio
+import base64
+import csv
+import io
+import json
+import math
+import orjson
+from database import (
+    get_db, get_read_db, read_session,
+    DB_ANALYTICS_TIMEOUT_MS, DB_EXPORT_TIMEOUT_MS, DB_QUERY_TIMEOUT_MS
+)
+from schemas import (
+    MeasurementCreate, MeasurementUpdate, MeasurementResponse,
+    MeasurementBulkCreate, MeasurementBulkResponse, MeasurementAggregateResponse,
+    MeasurementColumnarResponse, UTCDatetime
+)
+from models import Measurement
+from dependencies import get_current_user, get_current_admin_user, UserPrincipal
+from metrics import record_ingest
+from broker import broker
+from etags import bump_data_version, data_validators, not_modified
+from rollups import ROLLUP_RESOLUTIONS, aggregate_buckets, bucket_start, recompute_rollups
+from resample import FILL_METHODS, resample, time_axis
+from catalog import series_catalog
+from ingest import ingest_point, publish_measurements, write_measurements
 
 router = APIRouter(prefix="/api/measurements", tags=["Measurements"])
 
-@router.get("/", response_model=List[MeasurementResponse])
-def get_measurements(
+get_query_db = get_read_db(DB_QUERY_TIMEOUT_MS)
+get_analytics_db = get_read_db(DB_ANALYTICS_TIMEOUT_MS)
+
+STREAM_HEARTBEAT_SECONDS = 15
+MAX_ALIGNED_POINTS = 10000
+MAX_AGGREGATE_BUCKETS = 100000
+EXPORT_BATCH_SIZE = 5000
+EXPORT_COLUMNS = ("id", "series_id", "value", "timestamp", "created_by")
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+ARROW_RESPONSE = {
+    "content": {EXPORT_MEDIA_TYPES["arrow"]: {"schema": {"type": "string", "format": "binary"}}}
+}
+
+def _parse_series_ids(series_ids: Optional[str]) -> Optional[List[int]]:
+    if not series_ids:
+        return None
+    try:
+        return [int(id.strip()) for id in series_ids.split(",")]
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="series_ids must be a comma-separated list of integers"
+        )
+
+def _encode_cursor(timestamp: datetime, measurement_id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{measurement_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, measurement_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(measurement_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def _bucket_width(span_seconds: float, points: int) -> int:
+    bucket_seconds = max(1, math.ceil(span_seconds / points))
+    # Round wide buckets up to whole rollup periods so they can use rollups
+    for resolution in ROLLUP_RESOLUTIONS:
+        if bucket_seconds >= resolution:
+            bucket_seconds = math.ceil(bucket_seconds / resolution) * resolution
+    return bucket_seconds
+
+async def _export_batches(statement):
+    """Yield lists of row tuples from a server-side cursor
+
+    Uses its own session because the request-scoped one is closed before a
+    streaming response body is sent.
+    """
+    async with read_session(DB_EXPORT_TIMEOUT_MS) as db:
+        result = await db.stream(
+            statement.execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        async for partition in result.partitions():
+            yield partition
+
+def _rows_payload(rows) -> list:
+    return [
+        {
+            "id": row.id,
+            "series_id": row.series_id,
+            "value": row.value,
+            "timestamp": row.timestamp,
+            "created_by": row.created_by,
+        }
+        for row in rows
+    ]
+
+def _columnar_payload(rows) -> dict:
+    """Group rows into one timestamps/values pair of arrays per series"""
+    by_series = {}
+    for row in rows:
+        columns = by_series.get(row.series_id)
+        if columns is None:
+            columns = by_series[row.series_id] = {"series_id": row.series_id, "timestamps": [], "values": []}
+        columns["timestamps"].append(row.timestamp)
+        columns["values"].append(row.value)
+    return {"series": list(by_series.values())}
+
+async def _export_ndjson(statement):
+    async for batch in _export_batches(statement):
+        yield b"".join(
+            orjson.dumps(item, option=orjson.OPT_APPEND_NEWLINE)
+            for item in _rows_payload(batch)
+        )
+
+async def _export_csv(statement):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    async for batch in _export_batches(statement):
+        writer.writerows(
+            (row.id, row.series_id, row.value, row.timestamp.isoformat(), row.created_by)
+            for row in batch
+        )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def _measurement_arrow_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("id", pa.int64()),
+        ("series_id", pa.int32()),
+        ("value", pa.float64()),
+        ("timestamp", pa.timestamp("us")),
+        ("created_by", pa.int32()),
+    ])
+
+def _bucket_arrow_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("series_id", pa.int32()),
+        ("bucket", pa.timestamp("us")),
+        ("min", pa.float64()),
+        ("max", pa.float64()),
+        ("avg", pa.float64()),
+        ("count", pa.int64()),
+    ])
+
+def _arrow_response(columns, schema, headers) -> Response:
+    """Arrow IPC stream holding one record batch built from column lists"""
+    import pyarrow as pa
+
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        writer.write_batch(pa.record_batch(columns, schema=schema))
+    return Response(sink.getvalue(), media_type=EXPORT_MEDIA_TYPES["arrow"], headers=headers)
+
+async def _export_arrow(statement):
+    import pyarrow as pa
+
+    schema = _measurement_arrow_schema()
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        async for batch in _export_batches(statement):
+            columns = list(zip(*batch))
+            writer.write_batch(pa.record_batch(columns, schema=schema))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
+
+EXPORT_WRITERS = {
+    "ndjson": _export_ndjson,
+    "csv": _export_csv,
+    "arrow": _export_arrow,
+}
+
+@router.get(
+    "/",
+    response_model=Union[List[MeasurementResponse], MeasurementColumnarResponse],
+    responses={200: {
+        **ARROW_RESPONSE,
+        "description": "A list of measurements (format=rows), arrays per series "
+                       "(format=columnar) or an Arrow IPC stream (format=arrow)",
+    }}
+)
+async def get_measurements(
+    request: Request,
+    response: Response,
     series_ids: Optional[str] = Query(None, description="Comma-separated series IDs"),
-    start_date: Optional[datetime] = Query(None, description="Start date filter"),
-    end_date: Optional[datetime] = Query(None, description="End date filter"),
+    start_date: Optional[UTCDatetime] = Query(None, description="Start date filter"),
+    end_date: Optional[UTCDatetime] = Query(None, description="End date filter"),
     limit: int = Query(1000, ge=1, le=10000, description="Maximum number of results"),
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user)
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
+    since: Optional[UTCDatetime] = Query(None, description="Only measurements with a timestamp after this"),
+    after_id: Optional[int] = Query(None, description="Only measurements with an ID greater than this"),
+    format: str = Query("rows", pattern="^(rows|columnar|arrow)$", description="rows: list of measurements; columnar: timestamps/values arrays per series; arrow: Arrow IPC stream"),
+    db: AsyncSession = Depends(get_query_db),
+    current_user: Optional[UserPrincipal] = Depends(get_current_user)
 ):
-    """Get measurements with optional filters (public endpoint)"""
-    query = db.query(Measurement)
+    """Get measurements with optional filters (public endpoint)
 
+    Results are ordered newest first. When more rows are available the
+    X-Next-Cursor response header carries the cursor for the next page.
+    Pollers can pass since/after_id to fetch only new points, and get a 304
+    via If-None-Match/If-Modified-Since while the series are unchanged.
+
+    Rows are read as plain tuples and encoded with orjson directly, skipping
+    per-row model validation.
+    """
+    ids = _parse_series_ids(series_ids)
+    etag, last_modified = await data_validators(db, ids, str(request.url.query))
+    cached = not_modified(request, response, etag, last_modified)
+    if cached is not None:
+        return cached
+
+    query = select(
+        Measurement.id,
+        Measurement.series_id,
+        Measurement.value,
+        Measurement.timestamp,
+        Measurement.created_by,
+    )
 
-    if series_ids:
-        ids = [int(id.strip()) for id in series_ids.split(",")]
-        query = query.filter(Measurement.series_id.in_(ids))
+
+    if ids:
+        query = query.where(Measurement.series_id.in_(ids))
 
 
     if start_date:
-        query = query.filter(Measurement.timestamp >= start_date)
+        query = query.where(Measurement.timestamp >= start_date)
     if end_date:
-        query = query.filter(Measurement.timestamp <= end_date)
+        query = query.where(Measurement.timestamp <= end_date)
+
+    if since:
+        query = query.where(Measurement.timestamp > since)
+    if after_id is not None:
+        query = query.where(Measurement.id > after_id)
+
+    if cursor:
+        query = query.where(
+            tuple_(Measurement.timestamp, Measurement.id) < tuple_(*_decode_cursor(cursor))
+        )
+
+
+    rows = (await db.execute(query.order_by(
+        Measurement.timestamp.desc(), Measurement.id.desc()
+    ).limit(limit))).all()
 
+    if len(rows) == limit:
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = _encode_cursor(last.timestamp, last.id)
 
-    measurements = query.order_by(Measurement.timestamp.desc()).limit(limit).all()
+    if format == "arrow":
+        schema = _measurement_arrow_schema()
+        columns = list(zip(*rows)) or [[] for _ in schema]
+        return _arrow_response(columns, schema, dict(response.headers))
+
+    payload = _columnar_payload(rows) if format == "columnar" else _rows_payload(rows)
+    return ORJSONResponse(payload, headers=dict(response.headers))
+
+@router.get(
+    "/aggregate",
+    response_model=MeasurementAggregateResponse,
+    responses={200: {
+        **ARROW_RESPONSE,
+        "description": "Buckets as JSON, or an Arrow IPC stream of them (format=arrow)",
+    }}
+)
+async def get_measurement_aggregates(
+    request: Request,
+    response: Response,
+    series_ids: Optional[str] = Query(None, description="Comma-separated series IDs"),
+    start_date: Optional[UTCDatetime] = Query(None, description="Start date filter"),
+    end_date: Optional[UTCDatetime] = Query(None, description="End date filter"),
+    bucket_seconds: Optional[int] = Query(None, ge=1, description="Bucket width in seconds"),
+    points: int = Query(500, ge=1, le=10000, description="Target number of buckets per series (used when bucket_seconds is not given)"),
+    format: str = Query("json", pattern="^(json|arrow)$", description="json, or an Arrow IPC stream of the buckets"),
+    db: AsyncSession = Depends(get_analytics_db),
+    current_user: Optional[UserPrincipal] = Depends(get_current_user)
+):
+    """Get min/max/avg/count per time bucket (public endpoint)
+
+    Bucket widths that are whole hours or days are served mostly from the
+    measurement_rollups table. An explicit bucket_seconds is rejected when it
+    would yield more than MAX_AGGREGATE_BUCKETS buckets across all series.
+    With format=arrow the bucket width is sent in the X-Bucket-Seconds header.
+    """
+    ids = _parse_series_ids(series_ids)
+    etag, last_modified = await data_validators(db, ids, str(request.url.query))
+    cached = not_modified(request, response, etag, last_modified)
+    if cached is not None:
+        return cached
+
+    range_start, range_end = start_date, end_date
+    if range_start is None or range_end is None:
+        filters = []
+        if ids:
+            filters.append(Measurement.series_id.in_(ids))
+        if start_date:
+            filters.append(Measurement.timestamp >= start_date)
+        if end_date:
+            filters.append(Measurement.timestamp <= end_date)
+
+        first, last = (await db.execute(
+            select(func.min(Measurement.timestamp), func.max(Measurement.timestamp))
+            .where(*filters)
+        )).one()
+        range_start = range_start or first
+        range_end = range_end or last
+
+    if bucket_seconds is None:
+        if range_start is None or range_end is None:
+            bucket_seconds = 1
+
+        else:
+            bucket_seconds = _bucket_width((range_end - range_start).total_seconds(), points)
+
+    elif range_start is not None and range_end is not None:
+        series_count = len(ids) if ids else len(await series_catalog.all(db))
+        buckets_per_series = math.floor((range_end - range_start).total_seconds() / bucket_seconds) + 1
+        if buckets_per_series * series_count > MAX_AGGREGATE_BUCKETS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"bucket_seconds too small: at most {MAX_AGGREGATE_BUCKETS} buckets per request"
+            )
 
-    return measurements
+    buckets = await aggregate_buckets(db, ids, bucket_seconds, start_date, end_date)
+
+    if format == "arrow":
+        schema = _bucket_arrow_schema()
+        columns = [[bucket[field.name] for bucket in buckets] for field in schema]
+        headers = {**response.headers, "X-Bucket-Seconds": str(bucket_seconds)}
+        return _arrow_response(columns, schema, headers)
+
+    return {
+        "bucket_seconds": bucket_seconds,
+        "buckets": buckets
+    }
+
+@router.get("/aligned")
+async def get_aligned_measurements(
+    request: Request,
+    response: Response,
+    series_ids: Annotated[str, Query(description="Comma-separated series IDs")],
+    start_date: Annotated[UTCDatetime, Query(description="Start of the time axis")],
+    end_date: Annotated[UTCDatetime, Query(description="End of the time axis")],
+    step_seconds: Optional[int] = Query(None, ge=1, description="Axis step in seconds"),
+    points: int = Query(500, ge=1, le=MAX_ALIGNED_POINTS, description="Target number of steps (used when step_seconds is not given)"),
+    fill: str = Query("null", pattern=f"^({'|'.join(FILL_METHODS)})$", description="How to fill steps without data: null, locf or linear"),
+    db: AsyncSession = Depends(get_analytics_db),
+    current_user: Optional[UserPrincipal] = Depends(get_current_user)
+):
+    """Several series resampled onto one shared time axis (public endpoint)
+
+    Each step holds the average of the series' measurements in that step,
+    taken from the same buckets (and rollups) as /aggregate. The response is
+    {"step_seconds", "timestamps", "series": [{"series_id", "values"}]} with
+    values aligned to timestamps.
+    """
+    ids = _parse_series_ids(series_ids)
+    if not ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="series_ids is required"
+        )
+    if end_date <= start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end_date must be after start_date"
+        )
+
+    span = (end_date - start_date).total_seconds()
+    if step_seconds is None:
+        step_seconds = _bucket_width(span, points)
+    axis_start = bucket_start(start_date, step_seconds)
+    steps = math.floor((end_date - axis_start).total_seconds() / step_seconds) + 1
+    if steps > MAX_ALIGNED_POINTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"step_seconds too small: at most {MAX_ALIGNED_POINTS} steps per request"
+        )
+
+    etag, last_modified = await data_validators(db, ids, "aligned", str(request.url.query))
+    cached = not_modified(request, response, etag, last_modified)
+    if cached is not None:
+        return cached
+
+    buckets = await aggregate_buckets(db, ids, step_seconds, start_date, end_date)
+    matrix = resample(buckets, ids, axis_start, step_seconds, steps, fill)
+    return ORJSONResponse(
+        {
+            "step_seconds": step_seconds,
+            "timestamps": time_axis(axis_start, step_seconds, steps),
+            "series": [
+                {"series_id": series_id, "values": matrix[row]}
+                for row, series_id in enumerate(ids)
+            ],
+        },
+        headers=dict(response.headers)
+    )
+
+@router.get("/export")
+async def export_measurements(
+    format: str = Query("ndjson", pattern="^(ndjson|csv|arrow)$", description="Export format"),
+    series_ids: Optional[str] = Query(None, description="Comma-separated series IDs"),
+    start_date: Optional[UTCDatetime] = Query(None, description="Start date filter"),
+    end_date: Optional[UTCDatetime] = Query(None, description="End date filter"),
+    current_user: Optional[UserPrincipal] = Depends(get_current_user)
+):
+    """Stream all matching measurements without a row limit (public endpoint)"""
+    statement = select(
+        Measurement.id,
+        Measurement.series_id,
+        Measurement.value,
+        Measurement.timestamp,
+        Measurement.created_by,
+    )
+
+    ids = _parse_series_ids(series_ids)
+    if ids:
+        statement = statement.where(Measurement.series_id.in_(ids))
+    if start_date:
+        statement = statement.where(Measurement.timestamp >= start_date)
+    if end_date:
+        statement = statement.where(Measurement.timestamp <= end_date)
+
+    statement = statement.order_by(Measurement.timestamp, Measurement.id)
+
+    return StreamingResponse(
+        EXPORT_WRITERS[format](statement),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="measurements.{format}"'}
+    )
+
+@router.get("/stream")
+async def stream_measurements(
+    request: Request,
+    series_ids: Optional[str] = Query(None, description="Comma-separated series IDs"),
+    current_user: Optional[UserPrincipal] = Depends(get_current_user)
+):
+    """Server-Sent Events stream of new measurements (public endpoint)
+
+    Each "measurements" event carries a JSON list of points committed since
+    the previous event. A client that falls too far behind receives an
+    "overflow" event and should re-fetch before reconnecting.
+    """
+    subscription = broker.subscribe(_parse_series_ids(series_ids))
+
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                if subscription.overflowed:
+                    yield "event: overflow\ndata: {}\n\n"
+                    return
+                try:
+                    points = await asyncio.wait_for(subscription.queue.get(), STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                yield f"event: measurements\ndata: {json.dumps(points)}\n\n"
+        finally:
+            broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @router.get("/{measurement_id}", response_model=MeasurementResponse)
-def get_measurement_by_id(
+async def get_measurement_by_id(
     measurement_id: int,
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user)
+    db: AsyncSession = Depends(get_query_db),
+    current_user: Optional[UserPrincipal] = Depends(get_current_user)
 ):
     """Get a specific measurement by ID (public endpoint)"""
-    measurement = db.query(Measurement).filter(Measurement.id == measurement_id).first()
+    measurement = await db.get(Measurement, measurement_id)
     if not measurement:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -54,48 +505,105 @@ def get_measurement_by_id(
     return measurement
 
 @router.post("/", response_model=MeasurementResponse, status_code=status.HTTP_201_CREATED)
-def create_measurement(
+async def create_measurement(
     measurement_data: MeasurementCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    idempotency_key: Optional[str] = Header(None, max_length=100, description="Retries with the same key return the original measurement"),
+    db: AsyncSession = Depends(get_db),
+    current_user: UserPrincipal = Depends(get_current_admin_user)
 ):
-    """Create a new measurement (admin only)"""
+    """Create a new measurement (admin only)
 
-    series = db.query(Series).filter(Series.id == measurement_data.series_id).first()
-    if not series:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Series not found"
-        )
+    In buffered ingest mode the point is group-committed by the ingest
+    buffer; with queued acknowledgement the response is 202 without an id.
+    Writes carrying an Idempotency-Key are always written directly.
+    """
+    return await ingest_point(
+        db,
+        measurement_data.series_id,
+        measurement_data.value,
+        measurement_data.timestamp,
+        current_user.id,
+        idempotency_key
+    )
 
+@router.post("/bulk", response_model=MeasurementBulkResponse, status_code=status.HTTP_201_CREATED)
+async def create_measurements_bulk(
+    bulk_data: MeasurementBulkCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserPrincipal = Depends(get_current_admin_user)
+):
+    """Create many measurements in one transaction (admin only)
 
-    if not (series.min_value <= measurement_data.value <= series.max_value):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Value must be between {series.min_value} and {series.max_value}"
-        )
+    Each item is validated against its series range; invalid items are
+    reported as rejected and the rest are inserted with a single multi-row
+    INSERT. Items dropped by timestamp dedup, including repeats within the
+    request, are reported as duplicates.
+    """
+    series_ids = {item.series_id for item in bulk_data.items}
+    ranges = {
+        series.id: (series.min_value, series.max_value)
+        for series in (await series_catalog.get_many(db, series_ids)).values()
+    }
 
-    db_measurement = Measurement(
-        series_id=measurement_data.series_id,
-        value=measurement_data.value,
-        timestamp=measurement_data.timestamp or datetime.utcnow(),
-        created_by=current_user.id
-    )
-    db.add(db_measurement)
-    db.commit()
-    db.refresh(db_measurement)
+    now = datetime.utcnow()
+    results = []
+    rows = []
+    rejected_by_series = Counter()
+    for index, item in enumerate(bulk_data.items):
+        bounds = ranges.get(item.series_id)
+        if bounds is None:
+            results.append({"index": index, "accepted": False, "detail": "Series not found"})
+            continue
+
+        min_value, max_value = bounds
+        if not (min_value <= item.value <= max_value):
+            rejected_by_series[item.series_id] += 1
+            results.append({
+                "index": index,
+                "accepted": False,
+                "detail": f"Value must be between {min_value} and {max_value}"
+            })
+            continue
 
-    return db_measurement
+        results.append({"index": index, "accepted": True})
+        rows.append({
+            "series_id": item.series_id,
+            "value": item.value,
+            "timestamp": item.timestamp or now,
+            "created_by": current_user.id
+        })
+
+    written = 0
+    if rows:
+        inserted_ids = await write_measurements(db, rows)
+        await db.commit()
+
+        accepted = iter(inserted_ids)
+        for result in results:
+            if result["accepted"]:
+                result["id"] = next(accepted)
+                if result["id"] is None:
+                    result["accepted"] = False
+                    result["detail"] = "Duplicate of another measurement with the same series and timestamp"
+        written = await publish_measurements(rows, inserted_ids)
+    for series_id, count in rejected_by_series.items():
+        record_ingest(series_id, rejected=count)
+
+    return {
+        "accepted": written,
+        "rejected": len(results) - written,
+        "results": results
+    }
 
 @router.put("/{measurement_id}", response_model=MeasurementResponse)
-def update_measurement(
+async def update_measurement(
     measurement_id: int,
     measurement_update: MeasurementUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: UserPrincipal = Depends(get_current_admin_user)
 ):
     """Update a measurement (admin only)"""
-    measurement = db.query(Measurement).filter(Measurement.id == measurement_id).first()
+    measurement = await db.get(Measurement, measurement_id)
     if not measurement:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -103,9 +611,11 @@ def update_measurement(
         )
 
 
-    series = db.query(Series).filter(Series.id == measurement.series_id).first()
+    series = await series_catalog.get(db, measurement.series_id)
 
 
+    previous_timestamp = measurement.timestamp
+
     if measurement_update.value is not None:
 
         if not (series.min_value <= measurement_update.value <= series.max_value):
@@ -118,26 +628,39 @@ def update_measurement(
     if measurement_update.timestamp is not None:
         measurement.timestamp = measurement_update.timestamp
 
-    db.commit()
-    db.refresh(measurement)
+    try:
+        await db.flush()
+    except IntegrityError:
+        # Only the unique (series_id, timestamp) index of timestamp dedup can reject this
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="The series already has a measurement at this timestamp"
+        )
+    await recompute_rollups(db, measurement.series_id, {previous_timestamp, measurement.timestamp})
+    await bump_data_version(db, [measurement.series_id])
+    await db.commit()
 
     return measurement
 
 @router.delete("/{measurement_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_measurement(
+async def delete_measurement(
     measurement_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: UserPrincipal = Depends(get_current_admin_user)
 ):
     """Delete a measurement (admin only)"""
-    measurement = db.query(Measurement).filter(Measurement.id == measurement_id).first()
+    measurement = await db.get(Measurement, measurement_id)
     if not measurement:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Measurement not found"
         )
 
-    db.delete(measurement)
-    db.commit()
+    await db.delete(measurement)
+    await db.flush()
+    await recompute_rollups(db, measurement.series_id, [measurement.timestamp])
+    await bump_data_version(db, [measurement.series_id])
+    await db.commit()
 
     return None
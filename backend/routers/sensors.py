@@ -0,0 +1,94 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from database import get_db
+from schemas import (
+    SensorCreate, SensorResponse, SensorCreatedResponse,
+    SensorMeasurementCreate, MeasurementResponse
+)
+from models import Sensor, Series
+from auth import generate_api_key
+from dependencies import (
+    get_current_admin_user, get_current_sensor, invalidate_sensor_key,
+    SensorPrincipal, UserPrincipal
+)
+from ingest import ingest_point
+
+router = APIRouter(prefix="/api/sensors", tags=["Sensors"])
+
+@router.get("/", response_model=List[SensorResponse])
+async def get_all_sensors(
+    db: AsyncSession = Depends(get_db),
+    current_user: UserPrincipal = Depends(get_current_admin_user)
+):
+    """Get all sensors (admin only)"""
+    return (await db.scalars(select(Sensor).order_by(Sensor.created_at.desc()))).all()
+
+@router.post("/", response_model=SensorCreatedResponse, status_code=status.HTTP_201_CREATED)
+async def register_sensor(
+    sensor_data: SensorCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserPrincipal = Depends(get_current_admin_user)
+):
+    """Register a sensor for a series and return its API key (admin only)
+
+    The API key is only returned once, in this response.
+    """
+    series = await db.get(Series, sensor_data.series_id)
+    if not series:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Series not found"
+        )
+
+    db_sensor = Sensor(
+        name=sensor_data.name,
+        series_id=sensor_data.series_id,
+        api_key=generate_api_key(),
+        is_active=True
+    )
+    db.add(db_sensor)
+    await db.commit()
+
+    return db_sensor
+
+@router.post("/{sensor_id}/revoke", response_model=SensorResponse)
+async def revoke_sensor(
+    sensor_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserPrincipal = Depends(get_current_admin_user)
+):
+    """Revoke a sensor's API key (admin only)"""
+    sensor = await db.get(Sensor, sensor_id)
+    if not sensor:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Sensor not found"
+        )
+
+    sensor.is_active = False
+    await db.commit()
+    await invalidate_sensor_key(sensor.api_key)
+
+    return sensor
+
+@router.post("/measurements", response_model=MeasurementResponse, status_code=status.HTTP_201_CREATED)
+async def ingest_sensor_measurement(
+    measurement_data: SensorMeasurementCreate,
+    idempotency_key: Optional[str] = Header(None, max_length=100, description="Retries with the same key return the original measurement"),
+    db: AsyncSession = Depends(get_db),
+    sensor: SensorPrincipal = Depends(get_current_sensor)
+):
+    """Record a reading for the sensor's series (X-API-Key authentication)
+
+    Sensors retrying over flaky links should send an Idempotency-Key.
+    """
+    return await ingest_point(
+        db,
+        sensor.series_id,
+        measurement_data.value,
+        measurement_data.timestamp,
+        None,
+        idempotency_key
+    )
@@ -1,30 +1,47 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from database import get_db
-from schemas import SeriesCreate, SeriesUpdate, SeriesResponse
-from models import Series, User
-from dependencies import get_current_user, get_current_admin_user
+from database import get_db, get_read_db, DB_ANALYTICS_TIMEOUT_MS, DB_QUERY_TIMEOUT_MS
+from schemas import SeriesCreate, SeriesUpdate, SeriesResponse, SeriesStats, SeriesGapsResponse, UTCDatetime
+from models import Series
+from dependencies import get_current_user, get_current_admin_user, UserPrincipal
+from etags import data_validators, not_modified
+from catalog import series_catalog
+from stats import find_gaps, stats_cache, summarize
 
 router = APIRouter(prefix="/api/series", tags=["Series"])
 
+get_query_db = get_read_db(DB_QUERY_TIMEOUT_MS)
+get_analytics_db = get_read_db(DB_ANALYTICS_TIMEOUT_MS)
+
 @router.get("/", response_model=List[SeriesResponse])
-def get_all_series(
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user)
+async def get_all_series(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_query_db),
+    current_user: Optional[UserPrincipal] = Depends(get_current_user)
 ):
-    """Get all series (public endpoint)"""
-    series = db.query(Series).order_by(Series.created_at.desc()).all()
-    return series
+    """Get all series (public endpoint)
+
+    Served from the in-process series catalog. Supports conditional
+    requests: If-None-Match is answered with 304 while no series has been
+    created, changed or deleted.
+    """
+    cached = not_modified(request, response, await series_catalog.etag(db))
+    if cached is not None:
+        return cached
+
+    return await series_catalog.all(db)
 
 @router.get("/{series_id}", response_model=SeriesResponse)
-def get_series_by_id(
+async def get_series_by_id(
     series_id: int,
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user)
+    db: AsyncSession = Depends(get_query_db),
+    current_user: Optional[UserPrincipal] = Depends(get_current_user)
 ):
     """Get a specific series by ID (public endpoint)"""
-    series = db.query(Series).filter(Series.id == series_id).first()
+    series = await series_catalog.get(db, series_id)
     if not series:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -32,11 +49,86 @@ def get_series_by_id(
         )
     return series
 
+def _parse_percentiles(percentiles: str) -> List[float]:
+    try:
+        values = [float(value.strip()) for value in percentiles.split(",")]
+    except ValueError:
+        values = []
+    if not values or any(not 0 <= value <= 100 for value in values):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="percentiles must be a comma-separated list of numbers between 0 and 100"
+        )
+    return values
+
+async def _require_series(db: AsyncSession, series_id: int) -> None:
+    if await series_catalog.get(db, series_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Series not found"
+        )
+
+@router.get("/{series_id}/stats", response_model=SeriesStats)
+async def get_series_stats(
+    series_id: int,
+    request: Request,
+    response: Response,
+    start_date: Optional[UTCDatetime] = Query(None, description="Start of the window"),
+    end_date: Optional[UTCDatetime] = Query(None, description="End of the window"),
+    percentiles: str = Query("50,90,95,99", description="Comma-separated percentiles (0-100)"),
+    gap_seconds: Optional[float] = Query(None, gt=0, description="Minimum interval counted as a gap; default 3x the median interval"),
+    outlier_sigma: float = Query(3.0, gt=0, description="Values further than this many standard deviations from the mean are outliers"),
+    db: AsyncSession = Depends(get_analytics_db),
+    current_user: Optional[UserPrincipal] = Depends(get_current_user)
+):
+    """Summary statistics of a series over a window (public endpoint)
+
+    Results are cached until the series data changes.
+    """
+    await _require_series(db, series_id)
+    fractions = _parse_percentiles(percentiles)
+    etag, last_modified = await data_validators(db, [series_id], "stats", str(request.url.query))
+    cached = not_modified(request, response, etag, last_modified)
+    if cached is not None:
+        return cached
+
+    result = stats_cache.get(etag)
+    if result is None:
+        result = await summarize(db, series_id, start_date, end_date, fractions, gap_seconds, outlier_sigma)
+        result["series_id"] = series_id
+        stats_cache.set(etag, result)
+    return result
+
+@router.get("/{series_id}/stats/gaps", response_model=SeriesGapsResponse)
+async def get_series_gaps(
+    series_id: int,
+    request: Request,
+    response: Response,
+    start_date: Optional[UTCDatetime] = Query(None, description="Start of the window"),
+    end_date: Optional[UTCDatetime] = Query(None, description="End of the window"),
+    gap_seconds: Optional[float] = Query(None, gt=0, description="Minimum interval counted as a gap; default 3x the median interval"),
+    db: AsyncSession = Depends(get_analytics_db),
+    current_user: Optional[UserPrincipal] = Depends(get_current_user)
+):
+    """Intervals without measurements in a series, oldest first (public endpoint)"""
+    await _require_series(db, series_id)
+    etag, last_modified = await data_validators(db, [series_id], "gaps", str(request.url.query))
+    cached = not_modified(request, response, etag, last_modified)
+    if cached is not None:
+        return cached
+
+    result = stats_cache.get(etag)
+    if result is None:
+        result = await find_gaps(db, series_id, start_date, end_date, gap_seconds)
+        result["series_id"] = series_id
+        stats_cache.set(etag, result)
+    return result
+
 @router.post("/", response_model=SeriesResponse, status_code=status.HTTP_201_CREATED)
-def create_series(
+async def create_series(
     series_data: SeriesCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: UserPrincipal = Depends(get_current_admin_user)
 ):
     """Create a new series (admin only)"""
 
@@ -52,25 +144,26 @@ def create_series(
         min_value=series_data.min_value,
         max_value=series_data.max_value,
         color=series_data.color,
-        icon=series_data.icon,
         unit=series_data.unit,
+        raw_retention_days=series_data.raw_retention_days,
+        rollup_retention_days=series_data.rollup_retention_days,
         created_by=current_user.id
     )
     db.add(db_series)
-    db.commit()
-    db.refresh(db_series)
+    await db.commit()
+    await series_catalog.invalidate()
 
     return db_series
 
 @router.put("/{series_id}", response_model=SeriesResponse)
-def update_series(
+async def update_series(
     series_id: int,
     series_update: SeriesUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: UserPrincipal = Depends(get_current_admin_user)
 ):
     """Update a series (admin only)"""
-    series = db.query(Series).filter(Series.id == series_id).first()
+    series = await db.get(Series, series_id)
     if not series:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -89,26 +182,31 @@ def update_series(
             detail="max_value must be greater than min_value"
         )
 
-    db.commit()
-    db.refresh(series)
+    series.version += 1
+    await db.commit()
+    await series_catalog.invalidate()
 
     return series
 
 @router.delete("/{series_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_series(
+async def delete_series(
     series_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: UserPrincipal = Depends(get_current_admin_user)
 ):
-    """Delete a series (admin only)"""
-    series = db.query(Series).filter(Series.id == series_id).first()
-    if not series:
+    """Delete a series (admin only)
+
+    Measurements, rollups and sensors go with it through ON DELETE CASCADE,
+    without loading them into the session.
+    """
+    result = await db.execute(delete(Series).where(Series.id == series_id))
+    if result.rowcount == 0:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Series not found"
         )
 
-    db.delete(series)
-    db.commit()
+    await db.commit()
+    await series_catalog.invalidate()
 
     return None
@@ -1,7 +1,12 @@
 
-from pydantic import BaseModel, EmailStr, Field, field_validator
+from pydantic import AfterValidator, BaseModel, EmailStr, Field, field_validator
 from datetime import datetime
-from typing import Optional
+from typing import Annotated, Dict, List, Optional
+from rollups import naive_utc
+
+# Timestamp columns are TIMESTAMP WITHOUT TIME ZONE in UTC, and asyncpg
+# rejects aware datetimes for them
+UTCDatetime = Annotated[datetime, AfterValidator(naive_utc)]
 
 
 class UserBase(BaseModel):
@@ -31,6 +36,8 @@ class SeriesBase(BaseModel):
     max_value: float
     color: str = Field(default="#3B82F6", pattern="^#[0-9A-Fa-f]{6}$")
     unit: str = Field(default="", max_length=20)
+    raw_retention_days: Optional[int] = Field(None, ge=1)
+    rollup_retention_days: Optional[int] = Field(None, ge=1)
 
     @field_validator('max_value')
     def validate_max_greater_than_min(cls, v, info):
@@ -48,6 +55,8 @@ class SeriesUpdate(BaseModel):
     max_value: Optional[float] = None
     color: Optional[str] = Field(None, pattern="^#[0-9A-Fa-f]{6}$")
     unit: Optional[str] = Field(None, max_length=20)
+    raw_retention_days: Optional[int] = Field(None, ge=1)
+    rollup_retention_days: Optional[int] = Field(None, ge=1)
 
 class SeriesResponse(SeriesBase):
     id: int
@@ -57,18 +66,42 @@ class SeriesResponse(SeriesBase):
     class Config:
         from_attributes = True
 
+class SeriesStats(BaseModel):
+    series_id: int
+    count: int
+    mean: Optional[float]
+    stddev: Optional[float]
+    min: Optional[float]
+    max: Optional[float]
+    percentiles: Dict[str, Optional[float]]
+    latest_value: Optional[float]
+    latest_timestamp: Optional[datetime]
+    gap_threshold_seconds: Optional[float]
+    gap_count: int
+    max_gap_seconds: Optional[float]
+    outliers: int
+
+class SeriesGap(BaseModel):
+    start: datetime
+    end: datetime
+    seconds: float
+
+class SeriesGapsResponse(BaseModel):
+    series_id: int
+    gap_threshold_seconds: Optional[float]
+    gaps: List[SeriesGap]
 
 class MeasurementBase(BaseModel):
     series_id: int
     value: float
-    timestamp: Optional[datetime] = None
+    timestamp: Optional[UTCDatetime] = None
 
 class MeasurementCreate(MeasurementBase):
     pass
 
 class MeasurementUpdate(BaseModel):
     value: Optional[float] = None
-    timestamp: Optional[datetime] = None
+    timestamp: Optional[UTCDatetime] = None
 
 class MeasurementResponse(MeasurementBase):
     id: int
@@ -77,10 +110,71 @@ class MeasurementResponse(MeasurementBase):
     class Config:
         from_attributes = True
 
+class MeasurementColumns(BaseModel):
+    series_id: int
+    timestamps: List[datetime]
+    values: List[float]
+
+class MeasurementColumnarResponse(BaseModel):
+    series: List[MeasurementColumns]
+
+class MeasurementBucket(BaseModel):
+    series_id: int
+    bucket: datetime
+    min: float
+    max: float
+    avg: float
+    count: int
+
+class MeasurementAggregateResponse(BaseModel):
+    bucket_seconds: int
+    buckets: List[MeasurementBucket]
+
+class MeasurementBulkCreate(BaseModel):
+    items: List[MeasurementCreate] = Field(..., min_length=1, max_length=10000)
+
+class MeasurementBulkItemResult(BaseModel):
+    index: int
+    accepted: bool
+    id: Optional[int] = None
+    detail: Optional[str] = None
+
+class MeasurementBulkResponse(BaseModel):
+    accepted: int
+    rejected: int
+    results: List[MeasurementBulkItemResult]
+
+
+class SensorCreate(BaseModel):
+    name: str = Field(..., min_length=1, max_length=100)
+    series_id: int
+
+class SensorResponse(BaseModel):
+    id: int
+    name: str
+    series_id: int
+    is_active: bool
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class SensorCreatedResponse(SensorResponse):
+    api_key: str
+
+class SensorMeasurementCreate(BaseModel):
+    value: float
+    timestamp: Optional[UTCDatetime] = None
+
 
 class Token(BaseModel):
     access_token: str
+    refresh_token: str
     token_type: str
+    expires_in: int
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class LoginRequest(BaseModel):
     username: str
@@ -0,0 +1,227 @@
+from datetime import datetime
+from typing import List, Optional, Sequence
+import math
+import os
+import statistics
+
+from sqlalchemy import Float, cast, func, literal, select, type_coerce
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import TTLCache
+from models import Measurement
+
+# Without an explicit gap_seconds, a gap is an interval this many times the median one
+GAP_FACTOR = 3.0
+MAX_GAPS = 1000
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "300"))
+
+# ETag of the series data and parameters -> computed result
+stats_cache = TTLCache(maxsize=1024, ttl=STATS_CACHE_TTL)
+
+def _filters(series_id: int, start: Optional[datetime], end: Optional[datetime]) -> list:
+    filters = [Measurement.series_id == series_id]
+    if start is not None:
+        filters.append(Measurement.timestamp >= start)
+    if end is not None:
+        filters.append(Measurement.timestamp <= end)
+    return filters
+
+def _ordered_cte(series_id, start, end):
+    """Points in the window with the interval since the previous point and window-wide mean/stddev"""
+    previous = func.lag(Measurement.timestamp).over(order_by=Measurement.timestamp)
+    return (
+        select(
+            Measurement.timestamp,
+            Measurement.value,
+            previous.label("previous"),
+            cast(func.extract("epoch", Measurement.timestamp - previous), Float).label("gap"),
+            func.avg(Measurement.value).over().label("mean"),
+            func.stddev_samp(Measurement.value).over().label("stddev"),
+        )
+        .where(*_filters(series_id, start, end))
+        .cte("ordered")
+    )
+
+def _threshold(ordered, gap_seconds: Optional[float]):
+    if gap_seconds is not None:
+        return literal(gap_seconds, Float)
+    return (
+        select(func.percentile_cont(0.5).within_group(ordered.c.gap) * GAP_FACTOR)
+        .scalar_subquery()
+    )
+
+def _percentile(ordered_values: Sequence[float], fraction: float) -> float:
+    """Linear interpolation between closest ranks, like percentile_cont"""
+    position = fraction * (len(ordered_values) - 1)
+    lower = math.floor(position)
+    upper = min(lower + 1, len(ordered_values) - 1)
+    return ordered_values[lower] + (ordered_values[upper] - ordered_values[lower]) * (position - lower)
+
+def _empty_summary(percentiles: List[float]) -> dict:
+    return {
+        "count": 0,
+        "mean": None,
+        "stddev": None,
+        "min": None,
+        "max": None,
+        "percentiles": {_percentile_key(p): None for p in percentiles},
+        "latest_value": None,
+        "latest_timestamp": None,
+        "gap_threshold_seconds": None,
+        "gap_count": 0,
+        "max_gap_seconds": None,
+        "outliers": 0,
+    }
+
+def _percentile_key(percentile: float) -> str:
+    return f"p{percentile:g}"
+
+async def summarize(
+    db: AsyncSession,
+    series_id: int,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    percentiles: List[float],
+    gap_seconds: Optional[float],
+    outlier_sigma: float,
+) -> dict:
+    """Count, mean, stddev, percentiles, latest value, gaps and outliers of one series
+
+    Computed in a single statement on PostgreSQL. SQLite has no
+    percentile_cont or stddev, so the dev stand-in computes them here.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return await _summarize_python(db, series_id, start, end, percentiles, gap_seconds, outlier_sigma)
+
+    ordered = _ordered_cte(series_id, start, end)
+    threshold = _threshold(ordered, gap_seconds)
+    # Served by idx_measurements_series_timestamp instead of collecting the window
+    latest = (
+        select(Measurement.value)
+        .where(*_filters(series_id, start, end))
+        .order_by(Measurement.timestamp.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    row = (await db.execute(select(
+        func.count().label("count"),
+        func.avg(ordered.c.value).label("mean"),
+        func.stddev_samp(ordered.c.value).label("stddev"),
+        func.min(ordered.c.value).label("min"),
+        func.max(ordered.c.value).label("max"),
+        type_coerce(
+            func.percentile_cont(literal([p / 100 for p in percentiles], ARRAY(Float)))
+            .within_group(ordered.c.value),
+            ARRAY(Float)
+        ).label("percentiles"),
+        latest.label("latest_value"),
+        func.max(ordered.c.timestamp).label("latest_timestamp"),
+        threshold.label("gap_threshold_seconds"),
+        func.count().filter(ordered.c.gap > threshold).label("gap_count"),
+        func.max(ordered.c.gap).label("max_gap_seconds"),
+        func.count().filter(
+            func.abs(ordered.c.value - ordered.c.mean) > ordered.c.stddev * outlier_sigma
+        ).label("outliers"),
+    ).select_from(ordered))).one()
+
+    if not row.count:
+        return _empty_summary(percentiles)
+
+    summary = dict(row._mapping)
+    summary["percentiles"] = {
+        _percentile_key(p): value for p, value in zip(percentiles, row.percentiles)
+    }
+    return summary
+
+async def find_gaps(
+    db: AsyncSession,
+    series_id: int,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    gap_seconds: Optional[float],
+) -> dict:
+    """Intervals without data longer than the gap threshold, oldest first"""
+    if db.get_bind().dialect.name != "postgresql":
+        points = await _fetch_points(db, series_id, start, end)
+        intervals = _intervals(points)
+        threshold = _python_threshold(intervals, gap_seconds)
+        gaps = [
+            {"start": previous, "end": current, "seconds": seconds}
+            for previous, current, seconds in intervals
+            if threshold is not None and seconds > threshold
+        ]
+        return {"gap_threshold_seconds": threshold, "gaps": gaps[:MAX_GAPS]}
+
+    ordered = _ordered_cte(series_id, start, end)
+    threshold = _threshold(ordered, gap_seconds)
+    rows = (await db.execute(
+        select(
+            ordered.c.previous.label("start"),
+            ordered.c.timestamp.label("end"),
+            ordered.c.gap.label("seconds"),
+            threshold.label("threshold"),
+        )
+        .where(ordered.c.gap > threshold)
+        .order_by(ordered.c.timestamp)
+        .limit(MAX_GAPS)
+    )).all()
+
+    if rows:
+        threshold_value = rows[0].threshold
+    else:
+        threshold_value = (await db.execute(select(threshold))).scalar()
+    return {
+        "gap_threshold_seconds": threshold_value,
+        "gaps": [{"start": row.start, "end": row.end, "seconds": row.seconds} for row in rows],
+    }
+
+async def _fetch_points(db, series_id, start, end):
+    return (await db.execute(
+        select(Measurement.timestamp, Measurement.value)
+        .where(*_filters(series_id, start, end))
+        .order_by(Measurement.timestamp)
+    )).all()
+
+def _intervals(points):
+    return [
+        (previous.timestamp, current.timestamp, (current.timestamp - previous.timestamp).total_seconds())
+        for previous, current in zip(points, points[1:])
+    ]
+
+def _python_threshold(intervals, gap_seconds):
+    if gap_seconds is not None:
+        return gap_seconds
+    if not intervals:
+        return None
+    return statistics.median(seconds for _, _, seconds in intervals) * GAP_FACTOR
+
+async def _summarize_python(db, series_id, start, end, percentiles, gap_seconds, outlier_sigma):
+    points = await _fetch_points(db, series_id, start, end)
+    if not points:
+        return _empty_summary(percentiles)
+
+    values = [point.value for point in points]
+    ordered_values = sorted(values)
+    mean = statistics.fmean(values)
+    stddev = statistics.stdev(values) if len(values) > 1 else None
+    intervals = _intervals(points)
+    threshold = _python_threshold(intervals, gap_seconds)
+    return {
+        "count": len(values),
+        "mean": mean,
+        "stddev": stddev,
+        "min": ordered_values[0],
+        "max": ordered_values[-1],
+        "percentiles": {
+            _percentile_key(p): _percentile(ordered_values, p / 100) for p in percentiles
+        },
+        "latest_value": points[-1].value,
+        "latest_timestamp": points[-1].timestamp,
+        "gap_threshold_seconds": threshold,
+        "gap_count": sum(1 for _, _, seconds in intervals if threshold is not None and seconds > threshold),
+        "max_gap_seconds": max((seconds for _, _, seconds in intervals), default=None),
+        "outliers": 0 if stddev is None else sum(
+            1 for value in values if abs(value - mean) > stddev * outlier_sigma
+        ),
+    }
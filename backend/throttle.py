@@ -0,0 +1,54 @@
+from typing import Hashable
+import os
+import time
+
+from fastapi import HTTPException, status
+
+from cache import TTLCache
+
+LOGIN_FAILURE_LIMIT = int(os.getenv("LOGIN_FAILURE_LIMIT", "5"))
+LOGIN_FAILURE_WINDOW = float(os.getenv("LOGIN_FAILURE_WINDOW", "300"))
+LOGIN_IP_LIMIT = int(os.getenv("LOGIN_IP_LIMIT", "20"))
+LOGIN_IP_WINDOW = float(os.getenv("LOGIN_IP_WINDOW", "60"))
+
+class FixedWindowCounter:
+    """Counts events per key in fixed windows that start with the key's first event"""
+
+    def __init__(self, limit: int, window: float, maxsize: int = 100000):
+        self.limit = limit
+        self.window = window
+        self._counts = TTLCache(maxsize=maxsize, ttl=window)
+
+    def retry_after(self, key: Hashable) -> float:
+        """Seconds until key may try again, 0 when it is under the limit"""
+        entry = self._counts.get(key)
+        if entry is None or entry[0] < self.limit:
+            return 0
+        return max(entry[1] - time.monotonic(), 0)
+
+    def hit(self, key: Hashable) -> None:
+        now = time.monotonic()
+        entry = self._counts.get(key)
+        if entry is None:
+            self._counts.set(key, (1, now + self.window))
+        else:
+            count, resets_at = entry
+            self._counts.set(key, (count + 1, resets_at), ttl=resets_at - now)
+
+    def reset(self, key: Hashable) -> None:
+        self._counts.delete(key)
+
+# Failed logins per username, and all login attempts per client address
+login_failures = FixedWindowCounter(LOGIN_FAILURE_LIMIT, LOGIN_FAILURE_WINDOW)
+login_attempts = FixedWindowCounter(LOGIN_IP_LIMIT, LOGIN_IP_WINDOW)
+
+def check_login_allowed(username: str, client_ip: str) -> None:
+    """Raise 429 before any password work when the user or address is throttled"""
+    retry_after = max(login_failures.retry_after(username), login_attempts.retry_after(client_ip))
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts, try again later",
+            headers={"Retry-After": str(int(retry_after) + 1)},
+        )
+    login_attempts.hit(client_ip)
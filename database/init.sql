@@ -7,6 +7,13 @@ CREATE TABLE IF NOT EXISTS users (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+CREATE TABLE IF NOT EXISTS revoked_refresh_tokens (
+    jti VARCHAR(64) PRIMARY KEY,
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX idx_revoked_refresh_tokens_expires_at ON revoked_refresh_tokens(expires_at);
+
 CREATE TABLE IF NOT EXISTS series (
     id SERIAL PRIMARY KEY,
     name VARCHAR(100) NOT NULL,
@@ -16,20 +23,106 @@ CREATE TABLE IF NOT EXISTS series (
     color VARCHAR(7) DEFAULT '#3B82F6',
     icon VARCHAR(50) DEFAULT 'chart-line',
     unit VARCHAR(20) DEFAULT '',
+    raw_retention_days INTEGER,
+    rollup_retention_days INTEGER,
+    version BIGINT DEFAULT 1 NOT NULL,
+    data_version BIGINT DEFAULT 0 NOT NULL,
+    data_updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     created_by INTEGER REFERENCES users(id)
 );
 
+-- Range-partitioned by month; the primary key has to include the partition key
 CREATE TABLE IF NOT EXISTS measurements (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     series_id INTEGER NOT NULL REFERENCES series(id) ON DELETE CASCADE,
     value FLOAT NOT NULL,
     timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
-    created_by INTEGER REFERENCES users(id)
-);
+    created_by INTEGER REFERENCES users(id),
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+-- Catches rows outside every monthly partition until one is created for them
+CREATE TABLE IF NOT EXISTS measurements_default PARTITION OF measurements DEFAULT;
+
+CREATE INDEX idx_measurements_series_timestamp ON measurements(series_id, timestamp DESC) INCLUDE (value);
+CREATE INDEX idx_measurements_timestamp_id ON measurements(timestamp DESC, id DESC);
+
+-- Create the partition for the month containing month_start. Rows for that
+-- month already sitting in the default partition are moved into it.
+CREATE OR REPLACE FUNCTION create_measurement_partition(month_start DATE) RETURNS TEXT AS $$
+DECLARE
+    range_start TIMESTAMP := date_trunc('month', month_start);
+    range_end TIMESTAMP := date_trunc('month', month_start) + interval '1 month';
+    partition_name TEXT := 'measurements_' || to_char(month_start, 'YYYY_MM');
+BEGIN
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN partition_name;
+    END IF;
+
+    EXECUTE format(
+        'CREATE TABLE %I (LIKE measurements INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+        partition_name
+    );
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM measurements_default WHERE timestamp >= %L AND timestamp < %L RETURNING *) '
+        'INSERT INTO %I SELECT * FROM moved',
+        range_start, range_end, partition_name
+    );
+    EXECUTE format(
+        'ALTER TABLE measurements ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        partition_name, range_start, range_end
+    );
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
 
-CREATE INDEX idx_measurements_series_id ON measurements(series_id);
-CREATE INDEX idx_measurements_timestamp ON measurements(timestamp);
+-- Detach a month's partition, leaving it as a standalone table for archiving
+CREATE OR REPLACE FUNCTION detach_measurement_partition(month_start DATE) RETURNS TEXT AS $$
+DECLARE
+    partition_name TEXT := 'measurements_' || to_char(month_start, 'YYYY_MM');
+BEGIN
+    IF to_regclass(partition_name) IS NULL THEN
+        RETURN NULL;
+    END IF;
+    EXECUTE format('ALTER TABLE measurements DETACH PARTITION %I', partition_name);
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Re-attach a previously detached month
+CREATE OR REPLACE FUNCTION attach_measurement_partition(month_start DATE) RETURNS TEXT AS $$
+DECLARE
+    range_start TIMESTAMP := date_trunc('month', month_start);
+    partition_name TEXT := 'measurements_' || to_char(month_start, 'YYYY_MM');
+BEGIN
+    EXECUTE format(
+        'ALTER TABLE measurements ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        partition_name, range_start, range_start + interval '1 month'
+    );
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Partitions for the seed data window and the months ahead; the API keeps
+-- creating upcoming months at runtime
+SELECT create_measurement_partition((date_trunc('month', CURRENT_DATE) + (n * interval '1 month'))::date)
+FROM generate_series(-1, 2) AS n;
+
+CREATE TABLE IF NOT EXISTS measurement_rollups (
+    series_id INTEGER NOT NULL REFERENCES series(id) ON DELETE CASCADE,
+    bucket_seconds INTEGER NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    min FLOAT NOT NULL,
+    max FLOAT NOT NULL,
+    sum FLOAT NOT NULL,
+    count BIGINT NOT NULL,
+    first_value FLOAT NOT NULL,
+    first_timestamp TIMESTAMP NOT NULL,
+    last_value FLOAT NOT NULL,
+    last_timestamp TIMESTAMP NOT NULL,
+    PRIMARY KEY (series_id, bucket_seconds, bucket)
+);
 
 CREATE TABLE IF NOT EXISTS sensors (
     id SERIAL PRIMARY KEY,
@@ -41,3 +134,13 @@ CREATE TABLE IF NOT EXISTS sensors (
 );
 
 CREATE INDEX idx_sensors_api_key ON sensors(api_key);
+
+CREATE TABLE IF NOT EXISTS measurement_idempotency_keys (
+    series_id INTEGER NOT NULL REFERENCES series(id) ON DELETE CASCADE,
+    key VARCHAR(100) NOT NULL,
+    measurement_id INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    PRIMARY KEY (series_id, key)
+);
+
+CREATE INDEX idx_measurement_idempotency_keys_created_at ON measurement_idempotency_keys(created_at);
@@ -0,0 +1,31 @@
+-- Rebuild hourly and daily rollups from raw measurements.
+-- Runs after the seed data on a fresh database; safe to re-run on an
+-- existing one to fill in buckets that predate the rollup table.
+INSERT INTO measurement_rollups (
+    series_id, bucket_seconds, bucket, min, max, sum, count,
+    first_value, first_timestamp, last_value, last_timestamp
+)
+SELECT
+    m.series_id,
+    r.seconds,
+    date_bin(r.seconds * interval '1 second', m.timestamp, TIMESTAMP '2000-01-01') AS bucket,
+    min(m.value),
+    max(m.value),
+    sum(m.value),
+    count(*),
+    (array_agg(m.value ORDER BY m.timestamp, m.id))[1],
+    min(m.timestamp),
+    (array_agg(m.value ORDER BY m.timestamp DESC, m.id DESC))[1],
+    max(m.timestamp)
+FROM measurements m
+CROSS JOIN (VALUES (3600), (86400)) AS r(seconds)
+GROUP BY m.series_id, r.seconds, bucket
+ON CONFLICT (series_id, bucket_seconds, bucket) DO UPDATE SET
+    min = EXCLUDED.min,
+    max = EXCLUDED.max,
+    sum = EXCLUDED.sum,
+    count = EXCLUDED.count,
+    first_value = EXCLUDED.first_value,
+    first_timestamp = EXCLUDED.first_timestamp,
+    last_value = EXCLUDED.last_value,
+    last_timestamp = EXCLUDED.last_timestamp;
@@ -14,6 +14,7 @@ export const useAuthStore = defineStore('auth', () => {
       const response = await api.post('/api/auth/login', { username, password })
       token.value = response.data.access_token
       localStorage.setItem('access_token', token.value)
+      localStorage.setItem('refresh_token', response.data.refresh_token)
       await fetchCurrentUser()
       return true
     } catch (error) {
@@ -56,9 +57,14 @@ export const useAuthStore = defineStore('auth', () => {
   }
 
   function logout() {
+    const refreshToken = localStorage.getItem('refresh_token')
+    if (refreshToken) {
+      api.post('/api/auth/logout', { refresh_token: refreshToken }).catch(() => {})
+    }
     user.value = null
     token.value = null
     localStorage.removeItem('access_token')
+    localStorage.removeItem('refresh_token')
     localStorage.removeItem('user')
   }
 
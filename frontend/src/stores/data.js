@@ -1,5 +1,5 @@
 import { defineStore } from 'pinia'
-import { ref } from 'vue'
+import { ref, watch } from 'vue'
 import api from '../utils/api'
 
 export const useDataStore = defineStore('data', () => {
@@ -13,6 +13,7 @@ export const useDataStore = defineStore('data', () => {
   const loading = ref(false)
   const selectedMeasurementId = ref(null)
   const chartSelectionRange = ref(null)
+  let measurementStream = null
 
   async function fetchSeries() {
     try {
@@ -129,6 +130,43 @@ export const useDataStore = defineStore('data', () => {
     }
   }
 
+  function subscribeToMeasurements() {
+    unsubscribeFromMeasurements()
+
+    const params = new URLSearchParams()
+    if (selectedSeriesIds.value.length > 0) {
+      params.set('series_ids', selectedSeriesIds.value.join(','))
+    }
+
+    measurementStream = new EventSource(`${api.defaults.baseURL}/api/measurements/stream?${params}`)
+    measurementStream.addEventListener('measurements', (event) => {
+      const known = new Set(measurements.value.map((m) => m.id))
+      const fresh = JSON.parse(event.data).filter((m) => !known.has(m.id))
+      if (fresh.length > 0) {
+        measurements.value = [...fresh.reverse(), ...measurements.value]
+      }
+    })
+    measurementStream.addEventListener('overflow', async () => {
+      // Missed some points: reload the full view, then resume streaming
+      unsubscribeFromMeasurements()
+      await fetchMeasurements()
+      subscribeToMeasurements()
+    })
+  }
+
+  function unsubscribeFromMeasurements() {
+    if (measurementStream) {
+      measurementStream.close()
+      measurementStream = null
+    }
+  }
+
+  watch(selectedSeriesIds, () => {
+    if (measurementStream) {
+      subscribeToMeasurements()
+    }
+  }, { deep: true })
+
   function toggleSeriesSelection(seriesId) {
     const index = selectedSeriesIds.value.indexOf(seriesId)
     if (index === -1) {
@@ -170,6 +208,8 @@ export const useDataStore = defineStore('data', () => {
     createMeasurement,
     updateMeasurement,
     deleteMeasurement,
+    subscribeToMeasurements,
+    unsubscribeFromMeasurements,
     toggleSeriesSelection,
     setDateRange,
     setSelectedMeasurement,
@@ -19,11 +19,50 @@ api.interceptors.request.use((config) => {
 })
 
 
+// Requests that must not trigger a token refresh
+const TOKEN_ENDPOINTS = ['/api/auth/login', '/api/auth/refresh', '/api/auth/logout']
+
+let refreshing = null
+
+function refreshTokens() {
+  const refreshToken = localStorage.getItem('refresh_token')
+  if (!refreshToken) {
+    return Promise.reject(new Error('No refresh token'))
+  }
+  // Concurrent 401s share one refresh; the refresh token is single use
+  refreshing ??= axios
+    .post(`${API_BASE_URL}/api/auth/refresh`, { refresh_token: refreshToken })
+    .then((response) => {
+      localStorage.setItem('access_token', response.data.access_token)
+      localStorage.setItem('refresh_token', response.data.refresh_token)
+      return response.data.access_token
+    })
+    .finally(() => {
+      refreshing = null
+    })
+  return refreshing
+}
+
 api.interceptors.response.use(
   (response) => response,
-  (error) => {
+  async (error) => {
+    const request = error.config
+    if (request?.url === '/api/auth/logout') {
+      return Promise.reject(error)
+    }
+    if (error.response?.status === 401 && request && !request._retried && !TOKEN_ENDPOINTS.includes(request.url)) {
+      request._retried = true
+      try {
+        const token = await refreshTokens()
+        request.headers.Authorization = `Bearer ${token}`
+        return api(request)
+      } catch (refreshError) {
+        // Fall through to the login redirect
+      }
+    }
     if (error.response?.status === 401) {
       localStorage.removeItem('access_token')
+      localStorage.removeItem('refresh_token')
       localStorage.removeItem('user')
       window.location.href = '/login'
     }